@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+PPL Workout Tracker backend benchmarks.
+Run from the backend directory: python benchmark.py schedule | calendar | assembly | serialization | routes
+"""
+
+import os
+import copy
+import json
+import time
+import random
+import timeit
+import asyncio
+import logging
+import statistics
+import subprocess
+from datetime import datetime, timezone, timedelta
+from typing import List, Optional
+
+import httpx
+import typer
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+# server.py reads these at import time; the schedule benchmarks never touch MongoDB
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "ppl_benchmark")
+
+import server
+import synthetic
+
+cli = typer.Typer(help="Benchmarks for the PPL Workout Tracker backend")
+
+@cli.callback()
+def main():
+    """Run one of the benchmark groups below"""
+
+PROGRAM_AGES = [7, 30, 90, 365, 730, 1825, 3650]
+
+def legacy_workout_for_day(start_date: datetime, target_date: datetime, rest_day: int):
+    """Reference day-by-day walk that get_workout_for_day used before the closed form"""
+    rest_weekday = (rest_day + 6) % 7
+    if target_date.weekday() == rest_weekday:
+        return ("rest", 0)
+
+    workout_days_count = 0
+    current_day = start_date
+    while current_day < target_date:
+        if current_day.weekday() != rest_weekday:
+            workout_days_count += 1
+        current_day += timedelta(days=1)
+
+    return server.WORKOUT_CYCLE[workout_days_count % 6]
+
+@cli.command()
+def schedule(number: int = 200):
+    """Time get_workout_for_day against the legacy loop across program ages (tests/test_schedule.py checks they agree)"""
+    start_date = datetime(2024, 1, 1, 6, 30, tzinfo=timezone.utc)
+    typer.echo(f"\n{'age (days)':>10} {'legacy (us)':>12} {'closed form (us)':>17}")
+    for age in PROGRAM_AGES:
+        target_date = start_date + timedelta(days=age, hours=3)
+        # Rest the day after the target so neither path takes the rest-day shortcut
+        rest_day = (target_date.weekday() + 2) % 7
+        legacy = timeit.timeit(lambda: legacy_workout_for_day(start_date, target_date, rest_day), number=number)
+        closed_form = timeit.timeit(lambda: server.get_workout_for_day(start_date, target_date, rest_day), number=number)
+        typer.echo(f"{age:>10} {legacy / number * 1e6:>12.2f} {closed_form / number * 1e6:>17.2f}")
+
+def legacy_calendar(start_date: datetime, first_date: datetime, days: int, rest_day: int):
+    """Per-day schedule rows built the way /calendar did before iter_schedule"""
+    rows = []
+    for i in range(days):
+        target_date = first_date + timedelta(days=i)
+        week, phase = server.get_week_and_phase(start_date, target_date)
+        workout_type, workout_number = legacy_workout_for_day(start_date, target_date, rest_day)
+        rows.append((target_date, week, phase, workout_type, workout_number))
+    return rows
+
+@cli.command()
+def calendar(number: int = 20):
+    """Time iter_schedule against per-day lookups (tests/test_schedule.py checks they agree)"""
+    start_date = datetime(2023, 1, 1, 6, 30, tzinfo=timezone.utc)
+    first_date = start_date + timedelta(days=365, hours=3)
+    typer.echo(f"\n{'days':>6} {'legacy (ms)':>12} {'iter_schedule (ms)':>19}")
+    for days in [7, 30, 90, 365]:
+        legacy = timeit.timeit(lambda: legacy_calendar(start_date, first_date, days, 0), number=number)
+        incremental = timeit.timeit(lambda: list(server.iter_schedule(start_date, first_date, days, 0)), number=number)
+        typer.echo(f"{days:>6} {legacy / number * 1e3:>12.3f} {incremental / number * 1e3:>19.3f}")
+
+def legacy_upcoming_exercises(schedule_rows, last_loads: dict):
+    """Exercise lists assembled from deep copies of WORKOUT_PROGRAM with a name lookup per exercise"""
+    workouts = []
+    for _, _, phase, workout_key, is_rest in schedule_rows:
+        if is_rest:
+            continue
+        if "deload" in phase:
+            exercises = [{"name": "Light Activity - Deload Week", "sets": 0, "reps": "Recovery"}]
+        else:
+            exercises = copy.deepcopy(server.WORKOUT_PROGRAM[phase]["workouts"].get(workout_key, []))
+        for exercise in exercises:
+            last_load = last_loads.get(exercise["name"])
+            exercise["previous_load"] = last_load["load"] if last_load else None
+        workouts.append(exercises)
+    return workouts
+
+def compiled_upcoming_exercises(schedule_rows, last_loads: dict):
+    """Exercise lists rendered from the compiled templates"""
+    previous_loads = server.previous_loads_by_id(last_loads)
+    return [
+        server.build_exercises(server.get_workout_template(phase, workout_key), previous_loads)
+        for _, _, phase, workout_key, is_rest in schedule_rows
+        if not is_rest
+    ]
+
+@cli.command()
+def assembly(days: int = 30, number: int = 500):
+    """Time building the exercise lists of an upcoming-workouts response (tests/test_exercise_templates.py checks both agree)"""
+    last_loads = {
+        exercise_name: {"load": 20.0 + exercise_id, "sets": 3, "reps": "8-10"}
+        for exercise_name, exercise_id in server.EXERCISE_IDS.items()
+    }
+    # Start mid-program so the range covers training, deload and rest days
+    start_date = datetime(2024, 1, 1, 6, 30, tzinfo=timezone.utc)
+    schedule_rows = list(server.iter_schedule(start_date, start_date + timedelta(days=10), days, 0))
+
+    legacy = timeit.timeit(lambda: legacy_upcoming_exercises(schedule_rows, last_loads), number=number)
+    compiled = timeit.timeit(lambda: compiled_upcoming_exercises(schedule_rows, last_loads), number=number)
+    typer.echo(f"{days}-day upcoming workouts: deepcopy {legacy / number * 1e6:.1f} us, compiled {compiled / number * 1e6:.1f} us")
+
+def sample_all_progress(months: int):
+    """An /all-progress payload for roughly `months` months of logged training"""
+    rng = random.Random(7)
+    start_date = datetime(2024, 1, 1, 18, tzinfo=timezone.utc)
+    progress = {}
+    for day in range(months * 30):
+        workout_date = start_date + timedelta(days=day)
+        for exercise_name in rng.sample(list(server.EXERCISE_IDS), 6):
+            progress.setdefault(exercise_name, []).append({
+                "date": workout_date,
+                "load": round(rng.uniform(20, 180), 1),
+                "sets": 3,
+                "reps": "8-10"
+            })
+    return progress
+
+def sample_calendar(days: int):
+    """A /calendar payload for `days` days"""
+    start_date = datetime(2024, 1, 1, 6, 30, tzinfo=timezone.utc)
+    rows = []
+    for target_date, week, phase, workout_key, is_rest in server.iter_schedule(start_date, start_date + timedelta(days=40), days, 0):
+        workout_type, workout_number = server.split_workout_key(workout_key)
+        rows.append({
+            "date": target_date,
+            "week": week,
+            "phase": phase,
+            "workout_type": workout_type,
+            "workout_number": workout_number,
+            "workout_name": "Rest Day" if is_rest else f"{workout_type.title()}{workout_number}",
+            "is_rest_day": is_rest,
+            "is_completed": False
+        })
+    return rows
+
+@cli.command()
+def serialization(number: int = 20):
+    """Time jsonable_encoder + JSONResponse against FastJSONResponse (tests/test_serialization.py checks the bodies match)"""
+    payloads = {
+        "all-progress 12 months": sample_all_progress(12),
+        "all-progress 60 months": sample_all_progress(60),
+        "calendar 90 days": sample_calendar(90),
+        "calendar 365 days": sample_calendar(365),
+    }
+
+    typer.echo(f"{'payload':>24} {'bytes':>9} {'jsonable_encoder (ms)':>22} {'orjson (ms)':>12}")
+    for name, payload in payloads.items():
+        fast_body = server.FastJSONResponse(payload).body
+        default = timeit.timeit(lambda: JSONResponse(jsonable_encoder(payload)), number=number)
+        fast = timeit.timeit(lambda: server.FastJSONResponse(payload), number=number)
+        typer.echo(f"{name:>24} {len(fast_body):>9} {default / number * 1e3:>22.2f} {fast / number * 1e3:>12.2f}")
+
+def session_body(user_id: str, index: int) -> dict:
+    """The index-th of a series of distinct POST /workout-session bodies with every exercise loaded
+    
+    Each body is a different workout or day after today, so every timed write is a real insert
+    rather than a duplicate of the first one.
+    """
+    workout_type, workout_number = server.WORKOUT_CYCLE[index % 6]
+    target_date = datetime.now(timezone.utc) + timedelta(days=1 + index // 6)
+    return {
+        "user_id": user_id,
+        "workout_type": workout_type,
+        "workout_number": workout_number,
+        "week": 1,
+        "phase": "phase1",
+        "exercises": [
+            {"name": exercise.name, "sets": exercise.sets, "reps": exercise.reps, "load": 40.0}
+            for exercise in server.get_workout_template("phase1", f"{workout_type}{workout_number}")
+        ],
+        "date": target_date.isoformat()
+    }
+
+async def seed_benchmark_user(months: int, seed: int) -> str:
+    """Insert a started user with `months` months of synthetic history up to today"""
+    rng = synthetic.user_rng(seed, months)
+    now = datetime.now(timezone.utc)
+    user = synthetic.synthetic_user(rng, now - timedelta(days=months * 30), rng.randrange(7))
+    history = synthetic.synthetic_history(rng, user, now)
+    user["next_workout_index"] = history.next_workout_index
+
+    await server.db.users.insert_one(user)
+    await server.db.workout_sessions.insert_many(history.sessions)
+    await server.db.exercise_logs.insert_many(history.exercise_logs)
+    await server.db.exercise_last_loads.insert_one({"user_id": user["id"], "exercises": history.last_loads})
+    return user["id"]
+
+async def delete_benchmark_users(user_ids: List[str]):
+    await server.db.users.delete_many({"id": {"$in": user_ids}})
+    for collection_name in ("workout_sessions", "exercise_logs", "exercise_last_loads"):
+        await server.db[collection_name].delete_many({"user_id": {"$in": user_ids}})
+
+def benchmark_routes(user_id: str):
+    """(name, method, url, json body) for every API route, reading and writing as `user_id`
+    
+    A callable body is called with the request number, for routes whose requests must differ.
+    """
+    today = datetime.now(timezone.utc)
+    workout_date = (today + timedelta(days=3)).date().isoformat()
+    schedule_range = {"start": (today - timedelta(days=45)).date().isoformat(), "end": (today + timedelta(days=45)).date().isoformat()}
+    user = {"first_name": "Benchmark", "last_name": "Signup", "age": 30, "height": 180, "weight": 80, "gender": "male", "phone": "0000000000", "rest_day": 0}
+    return [
+        ("GET /", "GET", "/api/", None),
+        ("GET /stats", "GET", "/api/stats", None),
+        ("POST /users", "POST", "/api/users", user),
+        ("GET /users/{id}", "GET", f"/api/users/{user_id}", None),
+        ("GET /current-workout", "GET", f"/api/users/{user_id}/current-workout", None),
+        ("GET /calendar", "GET", f"/api/users/{user_id}/calendar", None),
+        ("GET /schedule (91 days)", "GET", f"/api/users/{user_id}/schedule?start={schedule_range['start']}&end={schedule_range['end']}", None),
+        ("GET /upcoming-workouts", "GET", f"/api/users/{user_id}/upcoming-workouts", None),
+        ("GET /workout/{date}", "GET", f"/api/users/{user_id}/workout/{workout_date}", None),
+        ("GET /exercise-progress/{name}", "GET", f"/api/users/{user_id}/exercise-progress/Bench Press", None),
+        ("GET /progress/{name}", "GET", f"/api/users/{user_id}/progress/Bench Press", None),
+        ("GET /progress/{name}?resolution=week", "GET", f"/api/users/{user_id}/progress/Bench Press?resolution=week", None),
+        ("GET /all-progress", "GET", f"/api/users/{user_id}/all-progress", None),
+        ("GET /dashboard", "GET", f"/api/users/{user_id}/dashboard", None),
+        # The batch bodies continue the series after the single writes, so they never collide
+        ("POST /workout-session", "POST", f"/api/users/{user_id}/workout-session", lambda index: session_body(user_id, index)),
+        (
+            "POST /workout-sessions:batch (10)", "POST", f"/api/users/{user_id}/workout-sessions:batch",
+            lambda index: [session_body(user_id, BATCH_SERIES_START + index * 10 + offset) for offset in range(10)]
+        ),
+    ]
+
+# Far enough into the session series that the single-write requests never reach it
+BATCH_SERIES_START = 100_000
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+async def time_route(http: httpx.AsyncClient, method: str, url: str, body, requests: int, concurrency: int, warmup: int) -> dict:
+    """Latency percentiles, throughput and Mongo commands per request for one route"""
+    def body_for(index: int):
+        return body(index) if callable(body) else body
+
+    for index in range(warmup):
+        await http.request(method, url, json=body_for(index))
+
+    latencies, statuses, commands = [], {}, []
+    pending = iter(range(warmup, warmup + requests))
+
+    async def worker():
+        for index in pending:
+            request_body = body_for(index)
+            started = time.perf_counter()
+            response = await http.request(method, url, json=request_body)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            commands.append(int(response.headers.get("x-mongo-commands", 0)))
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "p50_ms": round(percentile(latencies, 0.50) * 1e3, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1e3, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1e3, 3),
+        "requests_per_second": round(requests / elapsed, 1),
+        "mongo_commands": round(statistics.mean(commands), 2),
+        "status_codes": {str(status): count for status, count in sorted(statuses.items())}
+    }
+
+def use_in_memory_database():
+    """Point server.db at an in-memory stand-in so the suite runs without a mongod"""
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        typer.echo("--in-memory needs mongomock-motor: pip install mongomock-motor")
+        raise typer.Exit(code=1)
+    server.db = AsyncMongoMockClient()[os.environ["DB_NAME"]]
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run_route_benchmarks(months: List[int], requests: int, concurrency: int, warmup: int, seed: int) -> List[dict]:
+    await server.ensure_indexes()
+    results = []
+    user_ids = []
+    # Server errors count as 500s (e.g. aggregation stages the in-memory stand-in lacks) instead of aborting the run
+    transport = httpx.ASGITransport(app=server.app, raise_app_exceptions=False)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as http:
+            for history_months in months:
+                started = time.perf_counter()
+                user_id = await seed_benchmark_user(history_months, seed)
+                user_ids.append(user_id)
+                typer.echo(f"\nSeeded {history_months} months of history in {time.perf_counter() - started:.1f}s")
+                typer.echo(f"{'route':>38} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'req/s':>8} {'mongo':>6}")
+
+                for name, method, url, body in benchmark_routes(user_id):
+                    result = await time_route(http, method, url, body, requests, concurrency, warmup)
+                    if name == "POST /users":
+                        # Signups made while timing are cleaned up with the seeded users
+                        signups = await server.db.users.find({"last_name": "Signup"}, {"_id": 0, "id": 1}).to_list(None)
+                        user_ids.extend(user["id"] for user in signups)
+                    results.append({"route": name, "history_months": history_months, **result})
+                    typer.echo(
+                        f"{name:>38} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f}"
+                        f" {result['requests_per_second']:>8.1f} {result['mongo_commands']:>6.1f}"
+                    )
+                    failures = {status: count for status, count in result["status_codes"].items() if not status.startswith("2")}
+                    if failures:
+                        typer.echo(f"{'':>38} non-2xx responses: {failures}")
+    finally:
+        await delete_benchmark_users(user_ids)
+    return results
+
+@cli.command()
+def routes(
+    months: str = typer.Option("1,12,60", help="Comma-separated history lengths to seed, one user each"),
+    requests: int = typer.Option(200, help="Timed requests per route and history length"),
+    concurrency: int = typer.Option(1, help="Requests in flight at once"),
+    warmup: int = typer.Option(5, help="Untimed requests per route before timing"),
+    seed: int = typer.Option(42, help="Seed for the synthetic histories"),
+    in_memory: bool = typer.Option(False, help="Use mongomock-motor instead of MONGO_URL"),
+    output: str = typer.Option("benchmark-routes.json", help="Where to write the JSON results")
+):
+    """Time every API route in-process over an ASGI transport against seeded users"""
+    if in_memory:
+        use_in_memory_database()
+    # httpx logs every request at INFO under the server's logging config
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    history_months = [int(value) for value in months.split(",")]
+
+    try:
+        results = asyncio.run(run_route_benchmarks(history_months, requests, concurrency, warmup, seed))
+    finally:
+        server.client.close()
+
+    report = {
+        "commit": current_commit(),
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "database": "in-memory" if in_memory else "mongod",
+        "requests": requests,
+        "concurrency": concurrency,
+        "seed": seed,
+        "results": results
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    typer.echo(f"\nWrote {output}")
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+PPL Workout Tracker maintenance commands.
+Run from the backend directory: python manage.py --help
+"""
+
+import time
+import asyncio
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import typer
+
+import server
+import synthetic
+
+cli = typer.Typer(help="Maintenance commands for the PPL Workout Tracker database")
+
+def run(coroutine):
+    """Run a coroutine against the configured database and close the client afterwards"""
+    try:
+        return asyncio.run(coroutine)
+    finally:
+        server.client.close()
+
+async def aiter_documents(documents):
+    """Iterate a Motor cursor or a plain list the same way"""
+    if isinstance(documents, list):
+        for document in documents:
+            yield document
+    else:
+        async for document in documents:
+            yield document
+
+@cli.command("ensure-indexes")
+def ensure_indexes():
+    """Create every index declared in server.MONGO_INDEXES"""
+    run(server.ensure_indexes())
+    typer.echo("Indexes are up to date")
+
+@cli.command("check-indexes")
+def check_indexes():
+    """Fail if a declared index is missing; warn about indexes with no recorded use"""
+    report = run(server.check_indexes())
+    for name in report["unused"]:
+        typer.echo(f"UNUSED  {name}")
+    for name in report["missing"]:
+        typer.echo(f"MISSING {name}")
+    if report["missing"]:
+        raise typer.Exit(code=1)
+    typer.echo("All declared indexes exist")
+
+@cli.command("migrate-dates")
+def migrate_dates(batch_size: int = 500):
+    """Convert legacy ISO-string dates to BSON dates and set legacy sessions' day; safe to interrupt and rerun"""
+    results = run(server.migrate_all_datetime_fields(batch_size))
+    for collection_name, migrated in results.items():
+        typer.echo(f"{collection_name}: {migrated} documents migrated")
+
+@cli.command("rebuild-last-loads")
+def rebuild_last_loads(user_id: str = typer.Option(None, help="Only rebuild this user's map")):
+    """Regenerate the last-load-per-exercise map from exercise_logs"""
+    rebuilt = run(server.rebuild_last_loads(user_id))
+    typer.echo(f"Rebuilt last loads for {rebuilt} users")
+
+async def repair_pointers(user_id: str = None):
+    if user_id:
+        users = [{"id": user_id}]
+    else:
+        users = server.db.users.find({"program_start_date": {"$ne": None}}, {"_id": 0, "id": 1})
+    checked = 0
+    repaired = []
+    async for user in aiter_documents(users):
+        checked += 1
+        result = await server.repair_workout_pointer(user["id"])
+        if result and result[0] != result[1]:
+            repaired.append((user["id"], *result))
+    return checked, repaired
+
+@cli.command("repair-workout-pointers")
+def repair_workout_pointers(user_id: str = typer.Option(None, help="Only repair this user's pointer")):
+    """Recompute each user's next-expected-workout pointer from session history"""
+    checked, repaired = run(repair_pointers(user_id))
+    for current_user_id, previous, index in repaired:
+        typer.echo(f"{current_user_id}: {previous} -> {index}")
+    typer.echo(f"Checked {checked} users, repaired {len(repaired)}")
+
+async def seed_users(count: int, seed: int, max_days: int, miss_rate: float, end_date: datetime, batch_size: int, parallel: int):
+    """Generate synthetic users and write them with insert_many, at most `parallel` batches in flight"""
+    buffers = {"users": [], "workout_sessions": [], "exercise_logs": [], "exercise_last_loads": []}
+    totals = dict.fromkeys(buffers, 0)
+    slots = asyncio.Semaphore(parallel)
+    inserts = []
+    
+    async def insert(collection_name: str, documents: List[dict]):
+        try:
+            await server.db[collection_name].insert_many(documents, ordered=False)
+        finally:
+            slots.release()
+    
+    async def flush(collection_name: str):
+        documents = buffers[collection_name]
+        buffers[collection_name] = []
+        totals[collection_name] += len(documents)
+        # Generation waits here while every slot is busy, which bounds memory
+        await slots.acquire()
+        inserts.append(asyncio.create_task(insert(collection_name, documents)))
+    
+    for index in range(count):
+        rng = synthetic.user_rng(seed, index)
+        user = synthetic.random_user(rng, end_date, max_days)
+        history = synthetic.synthetic_history(rng, user, end_date, miss_rate)
+        user["next_workout_index"] = history.next_workout_index
+        
+        buffers["users"].append(user)
+        buffers["workout_sessions"].extend(history.sessions)
+        buffers["exercise_logs"].extend(history.exercise_logs)
+        if history.last_loads:
+            buffers["exercise_last_loads"].append({"user_id": user["id"], "exercises": history.last_loads})
+        
+        for collection_name, documents in buffers.items():
+            if len(documents) >= batch_size:
+                await flush(collection_name)
+    
+    for collection_name, documents in buffers.items():
+        if documents:
+            await flush(collection_name)
+    await asyncio.gather(*inserts)
+    return totals
+
+@cli.command("seed")
+def seed(
+    users: int = typer.Option(100, help="Number of synthetic users"),
+    seed: int = typer.Option(42, help="Same seed and end date give the same data"),
+    max_months: int = typer.Option(60, help="Longest history a user can have"),
+    miss_rate: float = typer.Option(0.1, help="Chance of skipping a scheduled training day"),
+    end_date: str = typer.Option(None, help="Last day of generated history (YYYY-MM-DD, default today)"),
+    batch_size: int = typer.Option(5000, help="Documents per insert_many"),
+    parallel: int = typer.Option(4, help="insert_many batches in flight at once")
+):
+    """Bulk insert synthetic users with realistic session and exercise log histories"""
+    if end_date:
+        last_day = datetime.fromisoformat(end_date).replace(tzinfo=timezone.utc)
+    else:
+        last_day = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    started = time.perf_counter()
+    totals = run(seed_users(users, seed, max_months * 30, miss_rate, last_day, batch_size, parallel))
+    elapsed = time.perf_counter() - started
+    
+    for collection_name, inserted in totals.items():
+        typer.echo(f"{collection_name}: {inserted} documents")
+    typer.echo(f"Seeded in {elapsed:.1f}s ({totals['exercise_logs'] / elapsed:.0f} exercise logs/s)")
+
+async def write_export(dataset: server.ExportDataset, export_format: server.ExportFormat, user_id: Optional[str], output: str) -> int:
+    written = 0
+    with open(output, "wb") as f:
+        async for chunk in server.export_history(dataset, export_format, user_id):
+            f.write(chunk)
+            written += len(chunk)
+    return written
+
+@cli.command("export")
+def export(
+    output: str = typer.Argument(..., help="File to write"),
+    dataset: server.ExportDataset = typer.Option(server.ExportDataset.EXERCISE_LOGS.value, help="Collection to export"),
+    format: server.ExportFormat = typer.Option(server.ExportFormat.CSV.value, help="File format"),
+    user_id: str = typer.Option(None, help="Only export this user's history (default: every user)")
+):
+    """Stream workout sessions or exercise logs to a CSV, NDJSON or Parquet file"""
+    started = time.perf_counter()
+    written = run(write_export(dataset, format, user_id, output))
+    typer.echo(f"Wrote {written} bytes to {output} in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    cli()
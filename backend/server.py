@@ -1,40 +1,316 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Depends
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.routing import APIRoute
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from bson import ObjectId
+from pymongo import ASCENDING, IndexModel, ReplaceOne, ReturnDocument, UpdateOne, monitoring
 import os
+import hashlib
+import functools
+import orjson
+import contextvars
+import threading
+import bisect
+import csv
+import io
+import base64
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Optional, Dict, Any, NamedTuple
+from types import MappingProxyType
 import uuid
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone, timedelta
 from enum import Enum
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Histogram:
+    """Prometheus-style histogram per label combination; observe() is safe from pymongo's threads"""
+    
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}  # label values -> [count per bucket..., count above the last bucket, sum]
+        self.lock = threading.Lock()
+    
+    def observe(self, label_values: tuple, value: float):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = {label_values: list(values) for label_values, values in self.series.items()}
+        for label_values, values in sorted(series.items()):
+            labels = ",".join(f'{name}="{escape_label_value(value)}"' for name, value in zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {values[-1]}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COMMAND_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Time to serve a request, by route template", ("method", "route", "status"), LATENCY_BUCKETS
+)
+http_request_mongo_duration = Histogram(
+    "http_request_mongo_seconds", "Time spent in Mongo commands while serving a request", ("method", "route"), LATENCY_BUCKETS
+)
+http_request_mongo_commands = Histogram(
+    "http_request_mongo_commands", "Mongo commands issued while serving a request", ("method", "route"), COMMAND_COUNT_BUCKETS
+)
+mongo_command_duration = Histogram(
+    "mongo_command_duration_seconds", "Mongo command round trip time", ("collection", "command", "outcome"), LATENCY_BUCKETS
+)
+
+# Mongo command counts and time for the request being served; Motor copies the context into its worker threads
+mongo_request_stats = contextvars.ContextVar("mongo_request_stats", default=None)
+
+class MongoCommandCounter(monitoring.CommandListener):
+    """Time every Mongo command by collection and add it to the stats of the request that issued it"""
+    
+    def __init__(self):
+        self.pending = {}  # request_id -> collection name
+    
+    def started(self, event):
+        # The collection is the value of the command's own key, except for getMore
+        collection = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+        self.pending[event.request_id] = collection if isinstance(collection, str) else ""
+        stats = mongo_request_stats.get()
+        if stats is not None:
+            stats["commands"] += 1
+    
+    def finished(self, event, outcome: str):
+        collection = self.pending.pop(event.request_id, "")
+        seconds = event.duration_micros / 1e6
+        mongo_command_duration.observe((collection, event.command_name, outcome), seconds)
+        stats = mongo_request_stats.get()
+        if stats is not None:
+            stats["seconds"] += seconds
+    
+    def succeeded(self, event):
+        self.finished(event, "succeeded")
+    
+    def failed(self, event):
+        self.finished(event, "failed")
+
+mongo_pool_wait = Histogram(
+    "mongo_pool_wait_seconds", "Time spent waiting to check a connection out of the pool", ("address",), LATENCY_BUCKETS
+)
+
+class MongoPoolMonitor(monitoring.ConnectionPoolListener):
+    """Track connections open, checked out and waited for across the client's pools"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()  # checkout start time of the waiting thread
+        self.open = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+    
+    def connection_check_out_started(self, event):
+        self.local.started = time.perf_counter()
+        with self.lock:
+            self.waiting += 1
+    
+    def connection_checked_out(self, event):
+        waited = time.perf_counter() - getattr(self.local, "started", time.perf_counter())
+        mongo_pool_wait.observe((f"{event.address[0]}:{event.address[1]}",), waited)
+        with self.lock:
+            self.waiting -= 1
+            self.checked_out += 1
+            self.waits += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+    
+    def connection_check_out_failed(self, event):
+        with self.lock:
+            self.waiting -= 1
+    
+    def connection_checked_in(self, event):
+        with self.lock:
+            self.checked_out -= 1
+    
+    def connection_created(self, event):
+        with self.lock:
+            self.open += 1
+    
+    def connection_closed(self, event):
+        with self.lock:
+            self.open -= 1
+    
+    def connection_ready(self, event):
+        pass
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        pass
+    
+    def pool_closed(self, event):
+        pass
+    
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "max_size": MONGO_POOL_OPTIONS.get("maxPoolSize", 100),
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "available": self.open - self.checked_out,
+                "waiting": self.waiting,
+                "wait_ms_avg": round(self.wait_seconds / self.waits * 1e3, 3) if self.waits else 0.0,
+                "wait_ms_max": round(self.max_wait_seconds * 1e3, 3)
+            }
+
+def optional_int(value: Optional[str]) -> Optional[int]:
+    return int(value) if value else None
+
+# Connection pool, timeout and server selection settings; unset values keep the driver defaults
+MONGO_POOL_OPTIONS = {
+    option: value
+    for option, value in {
+        "maxPoolSize": optional_int(os.environ.get('MONGO_MAX_POOL_SIZE')),
+        "minPoolSize": optional_int(os.environ.get('MONGO_MIN_POOL_SIZE')),
+        "maxIdleTimeMS": optional_int(os.environ.get('MONGO_MAX_IDLE_TIME_MS')),
+        "waitQueueTimeoutMS": optional_int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS')),
+        "connectTimeoutMS": optional_int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS')),
+        "socketTimeoutMS": optional_int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS')),
+        "serverSelectionTimeoutMS": optional_int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS')),
+    }.items()
+    if value is not None
+}
+
+# /ready fails when Mongo does not answer a ping within this deadline
+READY_TIMEOUT_SECONDS = float(os.environ.get('READY_TIMEOUT_SECONDS', '2'))
+# ...or when more requests than this are queued for a pool connection (unset: never)
+READY_MAX_POOL_WAITERS = optional_int(os.environ.get('READY_MAX_POOL_WAITERS'))
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+pool_monitor = MongoPoolMonitor()
+# tz_aware so BSON dates come back as UTC datetimes comparable with datetime.now(timezone.utc)
+client = AsyncIOMotorClient(
+    mongo_url,
+    tz_aware=True,
+    event_listeners=[MongoCommandCounter(), pool_monitor],
+    **MONGO_POOL_OPTIONS
+)
 db = client[os.environ['DB_NAME']]
 
+# "create" builds missing indexes on startup, "check" refuses to start without them, "off" skips both
+MONGO_INDEX_MODE = os.environ.get('MONGO_INDEX_MODE', 'create')
+
+# Wrap multi-collection writes in a transaction (requires a replica set or sharded cluster)
+MONGO_TRANSACTIONS = os.environ.get('MONGO_TRANSACTIONS', 'false').lower() == 'true'
+
+# Convert legacy ISO-string dates to BSON dates in the background after startup
+MIGRATE_DATES_ON_STARTUP = os.environ.get('MIGRATE_DATES_ON_STARTUP', 'false').lower() == 'true'
+
+# Decoded user profiles kept in memory; the TTL bounds staleness across multiple server processes
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '10000'))
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', '60'))
+
+# Acknowledge single session writes once queued and group-commit them in the background
+WRITE_BEHIND = os.environ.get('WRITE_BEHIND', 'false').lower() == 'true'
+# A group commit happens when the oldest queued write is this old or this many documents are queued
+WRITE_BEHIND_MAX_DELAY_MS = float(os.environ.get('WRITE_BEHIND_MAX_DELAY_MS', '50'))
+WRITE_BEHIND_MAX_DOCUMENTS = int(os.environ.get('WRITE_BEHIND_MAX_DOCUMENTS', '1000'))
+# Session writes that can wait in the queue before requests block
+WRITE_BEHIND_QUEUE_SIZE = int(os.environ.get('WRITE_BEHIND_QUEUE_SIZE', '10000'))
+
+# How long a session write's Idempotency-Key is remembered
+IDEMPOTENCY_KEY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_KEY_TTL_SECONDS', '86400'))
+
+# Let concurrent identical read requests share one computation
+COALESCE_REQUESTS = os.environ.get('COALESCE_REQUESTS', 'true').lower() == 'true'
+
 # Create the main app without a prefix
 app = FastAPI()
 
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson, which encodes datetimes, enums and numpy scalars natively"""
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+class FastJSONRoute(APIRoute):
+    """Route that renders plain dict/list results with FastJSONResponse instead of walking them with jsonable_encoder"""
+    
+    def __init__(self, path: str, endpoint, **kwargs):
+        @functools.wraps(endpoint)
+        async def render_fast(*args, **kwargs):
+            content = await endpoint(*args, **kwargs)
+            # Models still go through response_model validation; responses are already rendered
+            if isinstance(content, (BaseModel, Response)):
+                return content
+            return FastJSONResponse(content)
+        
+        super().__init__(path, render_fast, **kwargs)
+
 # Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=FastJSONRoute, default_response_class=FastJSONResponse)
 
 class Gender(str, Enum):
     MALE = "male"
     FEMALE = "female"
     OTHER = "other"
 
+class ProgressResolution(str, Enum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+class ProgressMetric(str, Enum):
+    MAX_LOAD = "max_load"
+    VOLUME = "volume"
+    E1RM = "e1rm"
+
 class WorkoutType(str, Enum):
     PUSH = "push"
     PULL = "pull"
     LEGS = "legs"
 
+class ImportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+    PARQUET = "parquet"
+
+class ExportDataset(str, Enum):
+    WORKOUT_SESSIONS = "workout_sessions"
+    EXERCISE_LOGS = "exercise_logs"
+
 class User(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     first_name: str
@@ -88,6 +364,7 @@ class WorkoutSessionCreate(BaseModel):
 class ExerciseLog(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
+    session_id: Optional[str] = None
     exercise_name: str
     load: float
     sets: int
@@ -102,6 +379,18 @@ class ExerciseLogCreate(BaseModel):
     sets: int
     reps: str
 
+class ImportRow(BaseModel):
+    """One exercise of one workout in an uploaded training history"""
+    date: datetime
+    workout_type: WorkoutType
+    workout_number: int
+    week: Optional[int] = None  # derived from the program start date when omitted
+    phase: Optional[str] = None
+    exercise_name: str
+    sets: int
+    reps: str
+    load: Optional[float] = None
+
 # Workout program structure based on the Excel file
 WORKOUT_PROGRAM = {
     "phase1": {
@@ -233,29 +522,170 @@ WORKOUT_PROGRAM = {
     }
 }
 
+class ProgramExercise(NamedTuple):
+    """One exercise slot of a compiled workout template"""
+    exercise_id: int
+    name: str
+    sets: int
+    reps: str
+
+def compile_program(program: dict):
+    """Freeze a program into read-only templates keyed by (phase, workout_key), numbering each exercise name"""
+    exercise_ids = {}
+    templates = {}
+    for phase, phase_data in program.items():
+        for workout_key, exercises in phase_data["workouts"].items():
+            templates[(phase, workout_key)] = tuple(
+                ProgramExercise(exercise_ids.setdefault(exercise["name"], len(exercise_ids)), exercise["name"], exercise["sets"], exercise["reps"])
+                for exercise in exercises
+            )
+    return MappingProxyType(templates), MappingProxyType(exercise_ids)
+
+# Compiled once at import; ids follow first appearance in WORKOUT_PROGRAM so they stay stable as it grows
+PROGRAM_TEMPLATES, EXERCISE_IDS = compile_program(WORKOUT_PROGRAM)
+
+DELOAD_TEMPLATE = (ProgramExercise(-1, "Light Activity - Deload Week", 0, "Recovery"),)
+
+def get_workout_template(phase: str, workout_key: str):
+    """Get the read-only exercise template for a phase and workout key"""
+    if "deload" in phase:
+        return DELOAD_TEMPLATE
+    return PROGRAM_TEMPLATES.get((phase, workout_key), ())
+
 # Helper functions
-def prepare_for_mongo(data):
-    if isinstance(data, dict):
-        for key, value in data.items():
-            if isinstance(value, datetime):
-                data[key] = value.isoformat()
+
+# Datetime fields per collection; stored as native BSON dates
+DATETIME_FIELDS = {
+    "users": ("program_start_date", "created_at"),
+    "workout_sessions": ("date", "completed_at"),
+    "exercise_logs": ("workout_date", "created_at")
+}
+
+def parse_datetime(value):
+    """Decode a stored date, accepting BSON dates and the legacy ISO strings"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if isinstance(value, datetime) and value.tzinfo is None:
+        # BSON dates are UTC; naive values come from clients that omit the offset
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+def encode_document(collection_name: str, data: dict) -> dict:
+    """Prepare a document for insertion, normalizing its datetime fields to UTC"""
+    for field in DATETIME_FIELDS[collection_name]:
+        if data.get(field) is not None:
+            data[field] = parse_datetime(data[field])
     return data
 
-def parse_from_mongo(item):
-    if isinstance(item, dict):
-        for key, value in item.items():
-            if isinstance(value, str) and 'T' in value:
-                try:
-                    item[key] = datetime.fromisoformat(value.replace('Z', '+00:00'))
-                except:
-                    pass
-    return item
+def decode_document(collection_name: str, document: dict) -> dict:
+    """Decode a stored document's datetime fields, whichever format they were written in"""
+    for field in DATETIME_FIELDS[collection_name]:
+        if document.get(field) is not None:
+            document[field] = parse_datetime(document[field])
+    return document
 
-def get_current_week_and_phase(start_date: datetime):
-    """Calculate current week and phase based on start date"""
-    current_date = datetime.now(timezone.utc)
-    days_elapsed = (current_date - start_date).days
-    week = (days_elapsed // 7) + 1
+async def migrate_datetime_fields(collection_name: str, batch_size: int = 500):
+    """Rewrite legacy ISO-string dates in a collection as BSON dates, resuming from the last checkpoint"""
+    fields = DATETIME_FIELDS[collection_name]
+    collection = db[collection_name]
+    checkpoint_id = f"bson_dates.{collection_name}"
+    checkpoint = await db.migrations.find_one({"_id": checkpoint_id}) or {}
+    migrated = checkpoint.get("migrated", 0)
+    
+    query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    if "last_id" in checkpoint:
+        query["_id"] = {"$gt": checkpoint["last_id"]}
+    projection = {field: 1 for field in fields}
+    
+    while True:
+        batch = await collection.find(query, projection).sort("_id", ASCENDING).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        
+        updates = []
+        for document in batch:
+            converted = {
+                field: parse_datetime(document[field])
+                for field in fields
+                if isinstance(document.get(field), str)
+            }
+            updates.append(UpdateOne({"_id": document["_id"]}, {"$set": converted}))
+        await collection.bulk_write(updates, ordered=False)
+        
+        migrated += len(batch)
+        query["_id"] = {"$gt": batch[-1]["_id"]}
+        await db.migrations.update_one(
+            {"_id": checkpoint_id},
+            {"$set": {"last_id": batch[-1]["_id"], "migrated": migrated}},
+            upsert=True
+        )
+    
+    return migrated
+
+async def migrate_session_days(batch_size: int = 500):
+    """Set the day field of sessions written before it existed, resuming from the last checkpoint
+    
+    A session whose day would duplicate another session of the same workout keeps no day, so
+    the unique index leaves it alone as it did before. Returns (updated, conflicting).
+    """
+    checkpoint_id = "session_days"
+    checkpoint = await db.migrations.find_one({"_id": checkpoint_id}) or {}
+    updated = checkpoint.get("updated", 0)
+    conflicting = checkpoint.get("conflicting", 0)
+    
+    query = {"day": {"$exists": False}}
+    if "last_id" in checkpoint:
+        query["_id"] = {"$gt": checkpoint["last_id"]}
+    
+    while True:
+        batch = await db.workout_sessions.find(query, {"date": 1}).sort("_id", ASCENDING).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        
+        updates = [
+            UpdateOne({"_id": document["_id"]}, {"$set": {"day": parse_datetime(document["date"]).date().isoformat()}})
+            for document in batch
+        ]
+        try:
+            await db.workout_sessions.bulk_write(updates, ordered=False)
+            updated += len(batch)
+        except BulkWriteError as error:
+            errors = error.details["writeErrors"]
+            if any(write_error["code"] != 11000 for write_error in errors):
+                raise
+            updated += len(batch) - len(errors)
+            conflicting += len(errors)
+        
+        query["_id"] = {"$gt": batch[-1]["_id"]}
+        await db.migrations.update_one(
+            {"_id": checkpoint_id},
+            {"$set": {"last_id": batch[-1]["_id"], "updated": updated, "conflicting": conflicting}},
+            upsert=True
+        )
+    
+    return updated, conflicting
+
+async def migrate_all_datetime_fields(batch_size: int = 500):
+    """Run the BSON date migration over every collection with datetime fields, then backfill session days"""
+    results = {}
+    for collection_name in DATETIME_FIELDS:
+        results[collection_name] = await migrate_datetime_fields(collection_name, batch_size)
+        logger.info(f"Migrated {results[collection_name]} {collection_name} documents to BSON dates")
+    
+    # Days come from the session dates, so this runs once they are converted
+    updated, conflicting = await migrate_session_days(batch_size)
+    logger.info(f"Set the day of {updated} sessions; {conflicting} duplicate another session's workout and keep none")
+    results["session_days"] = updated
+    return results
+
+def get_week_and_phase(start_date: datetime, target_date: datetime):
+    """Calculate week and phase for a target date based on start date"""
+    return get_week_and_phase_for_elapsed((target_date - start_date).days)
+
+def get_week_and_phase_for_elapsed(days_elapsed: int):
+    """Calculate week and phase from the number of whole days since the program started"""
+    # Dates before the start, including earlier hours of the start day, belong to the first week
+    week = (max(days_elapsed, 0) // 7) + 1
     
     if week <= 2:
         phase = "phase1"
@@ -277,138 +707,758 @@ def get_current_week_and_phase(start_date: datetime):
     
     return week, phase
 
+# 6-workout cycle: Push1, Pull1, Legs1, Push2, Pull2, Legs2
+WORKOUT_CYCLE = [
+    ("push", 1),
+    ("pull", 1),
+    ("legs", 1),
+    ("push", 2),
+    ("pull", 2),
+    ("legs", 2)
+]
+
+def get_rest_weekday(rest_day: int) -> int:
+    """Convert rest_day (0=Sunday) to weekday format (0=Monday)"""
+    # Sunday=0 -> weekday=6, Monday=1 -> weekday=0, etc.
+    return (rest_day + 6) % 7
+
+def count_schedule_steps(start_date: datetime, target_date: datetime) -> int:
+    """Count the daily steps from start_date that land before target_date (a partial day counts as a step)"""
+    elapsed = target_date - start_date
+    if elapsed <= timedelta(0):
+        return 0
+    return elapsed.days + (1 if elapsed.seconds or elapsed.microseconds else 0)
+
+def count_workout_days(start_date: datetime, target_date: datetime, rest_weekday: int) -> int:
+    """Count non-rest days stepping one day at a time from start_date while before target_date"""
+    total_days = count_schedule_steps(start_date, target_date)
+    full_weeks, remaining_days = divmod(total_days, 7)
+    
+    # Every full week holds exactly one rest day; the partial week holds one only if
+    # the rest weekday comes up within its first remaining_days days
+    rest_offset = (rest_weekday - start_date.weekday()) % 7
+    return full_weeks * 6 + remaining_days - (1 if rest_offset < remaining_days else 0)
+
 def get_workout_for_day(start_date: datetime, target_date: datetime, rest_day: int, user_id: str = None):
     """Get the workout type and number for a specific date, accounting for rest days and missed workouts"""
-    # Convert rest_day (0=Sunday) to weekday format (0=Monday)
-    # Sunday=0 -> weekday=6, Monday=1 -> weekday=0, etc.
-    rest_weekday = (rest_day + 6) % 7
+    rest_weekday = get_rest_weekday(rest_day)
     
     # Check if today is a rest day
     if target_date.weekday() == rest_weekday:
         return ("rest", 0)
     
     # Calculate how many workout days have passed (excluding rest days)
-    workout_days_count = 0
-    current_day = start_date
-    
-    while current_day < target_date:
-        if current_day.weekday() != rest_weekday:
-            workout_days_count += 1
-        current_day += timedelta(days=1)
-    
-    # 6-workout cycle: Push1, Pull1, Legs1, Push2, Pull2, Legs2
-    workout_cycle = workout_days_count % 6
-    
-    workout_map = {
-        0: ("push", 1),
-        1: ("pull", 1), 
-        2: ("legs", 1),
-        3: ("push", 2),
-        4: ("pull", 2),
-        5: ("legs", 2)
+    workout_days_count = count_workout_days(start_date, target_date, rest_weekday)
+    
+    return WORKOUT_CYCLE[workout_days_count % 6]
+
+def iter_schedule(start_date: datetime, first_date: datetime, days: int, rest_day: int):
+    """Yield (date, week, phase, workout_key, is_rest) for `days` consecutive days from first_date"""
+    rest_weekday = get_rest_weekday(rest_day)
+    start_weekday = start_date.weekday()
+    
+    # Work out the schedule state once, then advance it one day at a time
+    steps = count_schedule_steps(start_date, first_date)
+    workout_days_count = count_workout_days(start_date, first_date, rest_weekday)
+    days_elapsed = (first_date - start_date).days
+    target_date = first_date
+    
+    for _ in range(days):
+        week, phase = get_week_and_phase_for_elapsed(days_elapsed)
+        if target_date.weekday() == rest_weekday:
+            yield target_date, week, phase, "rest", True
+        else:
+            workout_type, workout_number = WORKOUT_CYCLE[workout_days_count % 6]
+            yield target_date, week, phase, f"{workout_type}{workout_number}", False
+        
+        # Moving the target a day later adds one step once it is past start_date;
+        # that step lands on the weekday `steps` days after the start
+        target_date += timedelta(days=1)
+        days_elapsed += 1
+        if target_date > start_date:
+            if (start_weekday + steps) % 7 != rest_weekday:
+                workout_days_count += 1
+            steps += 1
+
+def split_workout_key(workout_key: str):
+    """Split a workout key like "push1" into ("push", 1); "rest" becomes ("rest", 0)"""
+    if workout_key == "rest":
+        return ("rest", 0)
+    return (workout_key[:-1], int(workout_key[-1]))
+
+def get_expected_workout(start_date: datetime, rest_weekday: int, index: int):
+    """Date, type and number of the index-th workout day (0-based) counted from start_date"""
+    full_weeks, slot = divmod(index, 6)
+    # Within each week the rest day sits rest_offset days after the start weekday
+    rest_offset = (rest_weekday - start_date.weekday()) % 7
+    day_offset = slot if slot < rest_offset else slot + 1
+    workout_type, workout_number = WORKOUT_CYCLE[index % 6]
+    return start_date + timedelta(days=full_weeks * 7 + day_offset), workout_type, workout_number
+
+def session_completion_key(session_date: datetime, workout_type: str, workout_number: int) -> str:
+    return f"{parse_datetime(session_date).date()}_{workout_type}{workout_number}"
+
+async def is_expected_workout_completed(user_id: str, expected_date: datetime, workout_type: str, workout_number: int) -> bool:
+    """Check for a completed session of the given workout on the expected date's day"""
+    day_start = datetime.combine(expected_date.date(), datetime.min.time(), tzinfo=timezone.utc)
+    session = await db.workout_sessions.find_one(
+        {
+            "user_id": user_id,
+            "completed": True,
+            "date": {"$gte": day_start, "$lt": day_start + timedelta(days=1)},
+            "workout_type": workout_type,
+            "workout_number": workout_number
+        },
+        {"_id": 1}
+    )
+    return session is not None
+
+async def advance_workout_pointer(user: dict, sessions: List[dict]):
+    """Move the user's next-expected-workout pointer past workouts completed by newly logged sessions
+    
+    user is the document returned when the write reserved its sync sequence, so it carries the
+    pointer as of that write without another read.
+    """
+    if not sessions or not user.get("program_start_date"):
+        return
+    
+    user_id = user["id"]
+    start_date = parse_datetime(user["program_start_date"])
+    rest_weekday = get_rest_weekday(user.get("rest_day", 0))
+    index = user.get("next_workout_index", 0)
+    logged_keys = {
+        session_completion_key(session["date"], session["workout_type"], session["workout_number"])
+        for session in sessions
+        if session.get("completed")
     }
     
-    return workout_map[workout_cycle]
+    # The pointed-at workout was incomplete before, so only a newly logged session can complete it;
+    # past it, workouts logged earlier out of order have to be looked up
+    advanced = index
+    while True:
+        expected_date, workout_type, workout_number = get_expected_workout(start_date, rest_weekday, advanced)
+        if session_completion_key(expected_date, workout_type, workout_number) in logged_keys:
+            advanced += 1
+        elif advanced > index and await is_expected_workout_completed(user_id, expected_date, workout_type, workout_number):
+            advanced += 1
+        else:
+            break
+    
+    if advanced > index:
+        # $max keeps the pointer monotonic when concurrent writes advance it
+        await db.users.update_one({"id": user_id}, {"$max": {"next_workout_index": advanced}})
+
+async def first_incomplete_workout_index(user: dict) -> int:
+    """Index of the first expected workout without a completed session, from the full session history"""
+    start_date = parse_datetime(user["program_start_date"])
+    rest_weekday = get_rest_weekday(user.get("rest_day", 0))
+    
+    completed_keys = await get_completed_workout_keys(user["id"])
+    
+    index = 0
+    while session_completion_key(*get_expected_workout(start_date, rest_weekday, index)) in completed_keys:
+        index += 1
+    return index
+
+async def repair_workout_pointer(user_id: str):
+    """Recompute the next-expected-workout pointer from the full session history; returns (old, new) or None"""
+    user = await db.users.find_one({"id": user_id}, {"id": 1, "program_start_date": 1, "rest_day": 1, "next_workout_index": 1})
+    if not user or not user.get("program_start_date"):
+        return None
+    
+    index = await first_incomplete_workout_index(user)
+    previous = user.get("next_workout_index", 0)
+    if index != previous:
+        await db.users.update_one({"id": user_id}, {"$set": {"next_workout_index": index}})
+    return previous, index
+
+async def backfill_workout_pointers():
+    """Set the pointer of users who started the program before it existed; returns how many were set"""
+    backfilled = 0
+    async for user in db.users.find(
+        {"next_workout_index": {"$exists": False}, "program_start_date": {"$ne": None}},
+        {"id": 1, "program_start_date": 1, "rest_day": 1}
+    ):
+        index = await first_incomplete_workout_index(user)
+        # $max rather than $set: a write that advanced the pointer meanwhile is never rolled back
+        await db.users.update_one({"id": user["id"]}, {"$max": {"next_workout_index": index}})
+        backfilled += 1
+    return backfilled
 
 async def get_current_workout_accounting_for_completion(user_id: str, target_date: datetime, start_date: datetime, rest_day: int):
     """Get current workout accounting for missed/incomplete previous workouts"""
+    user = await db.users.find_one({"id": user_id}, {"next_workout_index": 1})
+    index = (user or {}).get("next_workout_index", 0)
     
-    # Convert rest_day (0=Sunday) to weekday format (0=Monday)
-    rest_weekday = (rest_day + 6) % 7
-    
-    # Get all completed workout sessions for this user
-    completed_sessions = await db.workout_sessions.find(
-        {"user_id": user_id, "completed": True}
-    ).sort("date", 1).to_list(None)
-    
-    # Calculate expected workout sequence from start date
-    expected_workouts = []
-    current_day = start_date
-    workout_sequence = ["push1", "pull1", "legs1", "push2", "pull2", "legs2"]
-    sequence_index = 0
-    
-    while current_day <= target_date:
-        # Skip rest days
-        if current_day.weekday() != rest_weekday:
-            expected_workouts.append({
-                "date": current_day,
-                "workout_type": workout_sequence[sequence_index % 6].replace("1", "").replace("2", ""),
-                "workout_number": int(workout_sequence[sequence_index % 6][-1]),
-                "sequence_key": workout_sequence[sequence_index % 6]
-            })
-            sequence_index += 1
-        current_day += timedelta(days=1)
-    
-    # Find the first uncompleted workout
-    completed_workout_keys = set()
-    for session in completed_sessions:
-        session_date = session["date"] if isinstance(session["date"], datetime) else datetime.fromisoformat(session["date"].replace('Z', '+00:00'))
-        workout_key = f"{session['workout_type']}{session['workout_number']}"
-        completed_workout_keys.add(f"{session_date.date()}_{workout_key}")
-    
-    # Find first uncompleted expected workout
-    for expected in expected_workouts:
-        expected_key = f"{expected['date'].date()}_{expected['workout_type']}{expected['workout_number']}"
-        if expected_key not in completed_workout_keys:
-            return expected["workout_type"], expected["workout_number"]
+    # The pointer is the first uncompleted workout; it counts if it is due by target_date
+    expected_date, workout_type, workout_number = get_expected_workout(start_date, get_rest_weekday(rest_day), index)
+    if expected_date <= target_date:
+        return workout_type, workout_number
     
     # If all expected workouts are complete, continue with the sequence
     workout_type, workout_number = get_workout_for_day(start_date, target_date, rest_day)
     return workout_type, workout_number
 
+def last_load_key(exercise_name: str) -> str:
+    """Escape an exercise name so it can be used as a field name in update paths"""
+    return exercise_name.replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+def exercise_name_from_key(key: str) -> str:
+    """Reverse last_load_key"""
+    return key.replace("%24", "$").replace("%2E", ".").replace("%25", "%")
+
+def last_load_updates(user_id: str, exercise_logs: List[dict]):
+    """Build the bulk operations that fold new exercise logs into the user's last-load map"""
+    # Only the newest log per exercise can win
+    newest = {}
+    for log in exercise_logs:
+        current = newest.get(log["exercise_name"])
+        if current is None or log["workout_date"] >= current["workout_date"]:
+            newest[log["exercise_name"]] = log
+    
+    if not newest:
+        return []
+    
+    # Create the map document first so the conditional updates below never need to upsert
+    updates = [UpdateOne(
+        {"user_id": user_id},
+        {"$setOnInsert": {"user_id": user_id, "exercises": {}}},
+        upsert=True
+    )]
+    for exercise_name, log in newest.items():
+        field = f"exercises.{last_load_key(exercise_name)}"
+        # Only replace an entry with one from the same date or later, so late or replayed writes never roll it back
+        updates.append(UpdateOne(
+            {
+                "user_id": user_id,
+                "$or": [{f"{field}.date": {"$lte": log["workout_date"]}}, {field: {"$exists": False}}]
+            },
+            {"$set": {field: {
+                "load": log["load"],
+                "sets": log["sets"],
+                "reps": log["reps"],
+                "date": log["workout_date"]
+            }}}
+        ))
+    return updates
+
+async def get_last_loads(user_id: str):
+    """Get the user's last load per exercise name from the materialized map"""
+    document = await db.exercise_last_loads.find_one({"user_id": user_id}, {"exercises": 1})
+    if not document:
+        return {}
+    return {exercise_name_from_key(key): entry for key, entry in document.get("exercises", {}).items()}
+
+def previous_loads_by_id(last_loads: dict):
+    """Key the user's last loads by program exercise id"""
+    return {
+        EXERCISE_IDS[exercise_name]: entry["load"]
+        for exercise_name, entry in last_loads.items()
+        if exercise_name in EXERCISE_IDS
+    }
+
+def build_exercises(template, previous_loads: dict) -> List[dict]:
+    """Render a workout template as response rows with the user's previous loads overlaid"""
+    return [
+        {
+            "name": exercise.name,
+            "sets": exercise.sets,
+            "reps": exercise.reps,
+            "previous_load": previous_loads.get(exercise.exercise_id)
+        }
+        for exercise in template
+    ]
+
+async def rebuild_last_loads(user_id: Optional[str] = None, batch_size: int = 500):
+    """Regenerate the last-load map from exercise_logs for one user or for every user"""
+    pipeline = []
+    if user_id:
+        pipeline.append({"$match": {"user_id": user_id}})
+    # Sorting on the user_exercise_date index lets $group take each exercise's newest log with $last
+    pipeline += [
+        {"$sort": {"user_id": 1, "exercise_name": 1, "workout_date": 1}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "exercise_name": "$exercise_name"},
+            "load": {"$last": "$load"},
+            "sets": {"$last": "$sets"},
+            "reps": {"$last": "$reps"},
+            "date": {"$last": "$workout_date"}
+        }},
+        {"$group": {
+            "_id": "$_id.user_id",
+            "exercises": {"$push": {
+                "name": "$_id.exercise_name",
+                "load": "$load",
+                "sets": "$sets",
+                "reps": "$reps",
+                "date": "$date"
+            }}
+        }}
+    ]
+    
+    rebuilt = 0
+    replacements = []
+    async for group in db.exercise_logs.aggregate(pipeline, allowDiskUse=True):
+        exercises = {
+            last_load_key(entry.pop("name")): entry
+            for entry in group["exercises"]
+        }
+        replacements.append(ReplaceOne(
+            {"user_id": group["_id"]},
+            {"user_id": group["_id"], "exercises": exercises},
+            upsert=True
+        ))
+        if len(replacements) >= batch_size:
+            await db.exercise_last_loads.bulk_write(replacements, ordered=False)
+            rebuilt += len(replacements)
+            replacements = []
+    
+    if replacements:
+        await db.exercise_last_loads.bulk_write(replacements, ordered=False)
+        rebuilt += len(replacements)
+    
+    return rebuilt
+
+class UserProfile(NamedTuple):
+    """A decoded user document with its schedule settings already parsed"""
+    user: dict
+    start_date: Optional[datetime]
+    rest_day: int
+    rest_weekday: int
+    data_version: int
+
+def build_user_profile(user: dict) -> UserProfile:
+    user = decode_document("users", user)
+    rest_day = user.get("rest_day", 0)
+    return UserProfile(user, user.get("program_start_date"), rest_day, get_rest_weekday(rest_day), user.get("data_version", 0))
+
+class UserProfileCache:
+    """Bounded LRU cache of user profiles whose entries expire after a TTL"""
+    
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()  # user_id -> (expires_at, profile)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, user_id: str) -> Optional[UserProfile]:
+        entry = self.entries.get(user_id)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self.entries[user_id]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+    
+    def put(self, user_id: str, profile: UserProfile):
+        self.entries[user_id] = (time.monotonic() + self.ttl_seconds, profile)
+        self.entries.move_to_end(user_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+    
+    def invalidate(self, user_id: str):
+        self.entries.pop(user_id, None)
+    
+    def stats(self) -> dict:
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+user_cache = UserProfileCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
+# Data version user_data_etag read for the current request; the response must be at least this fresh
+etag_data_version = contextvars.ContextVar("etag_data_version", default=None)
+
+async def get_user_profile(user_id: str) -> UserProfile:
+    """Get a user's decoded profile from the cache, loading it from Mongo on a miss"""
+    profile = user_cache.get(user_id)
+    data_version = etag_data_version.get()
+    if profile is not None and data_version is not None and profile.data_version < data_version:
+        # The ETag promises data as of a newer version than the cached profile was read at
+        profile = None
+    if profile is None:
+        user = await db.users.find_one({"id": user_id})
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        profile = build_user_profile(user)
+        # Another process may start the program at any moment; caching the not-started state
+        # would make get_started_profile reject the user until the entry expired
+        if profile.start_date:
+            user_cache.put(user_id, profile)
+    return profile
+
+async def get_started_profile(user_id: str) -> UserProfile:
+    """Get a user's profile, requiring that the program has been started"""
+    profile = await get_user_profile(user_id)
+    if not profile.start_date:
+        raise HTTPException(status_code=400, detail="Program not started")
+    return profile
+
+async def get_data_version(user_id: str) -> Optional[int]:
+    """Read the user's data version straight from Mongo so every server process agrees on it"""
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "data_version": 1})
+    if not user:
+        return None
+    return user.get("data_version", 0)
+
+def build_etag(request: Request, user_id: str, data_version: int) -> str:
+    """ETag for a user's derived data as of today, distinct per URL and representation"""
+    representation = f"{request.url.path}?{request.url.query}|{request.headers.get('accept', '')}"
+    digest = hashlib.sha1(representation.encode()).hexdigest()[:12]
+    today = datetime.now(timezone.utc).date().isoformat()
+    # Weak: schedule rows embed the request's time of day, so bodies are equivalent rather than byte-identical
+    return f'W/"{user_id}-{data_version}-{today}-{digest}"'
+
+async def user_data_etag(request: Request, user_id: str):
+    """Answer 304 when If-None-Match still matches the user's data, before any session or log queries run"""
+    # Queued writes must land first, or the ETag and the response would miss them
+    await flush_pending_writes(user_id)
+    data_version = await get_data_version(user_id)
+    if data_version is None:
+        # Leave unknown users to the endpoint's own handling
+        return
+    
+    etag = build_etag(request, user_id, data_version)
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]:
+        raise HTTPException(status_code=304, headers={"ETag": etag})
+    
+    # Added to the response by the annotate_response middleware
+    request.state.etag = etag
+    request.state.data_version = data_version
+    etag_data_version.set(data_version)
+
+class SingleFlight:
+    """Shares one in-flight computation between concurrent callers asking for the same key"""
+    
+    def __init__(self):
+        self.flights = {}  # key -> task
+        self.leaders = 0
+        self.coalesced = 0
+    
+    async def run(self, key, compute):
+        task = self.flights.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(compute())
+            self.flights[key] = task
+            task.add_done_callback(lambda _: self.flights.pop(key, None))
+        else:
+            self.coalesced += 1
+        # A caller that disconnects must not cancel the computation the others are waiting on
+        return await asyncio.shield(task)
+    
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self.flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced
+        }
+
+single_flight = SingleFlight()
+
+async def coalesce_request(request: Request, user_id: str, compute):
+    """Run compute() once for concurrent requests to the same route, user, query and data version"""
+    if not COALESCE_REQUESTS:
+        return await compute()
+    
+    # Set by user_data_etag on routes that have it
+    data_version = getattr(request.state, "data_version", None)
+    if data_version is None:
+        data_version = await get_data_version(user_id)
+    
+    key = (request.scope["route"].path, user_id, request.url.query, data_version)
+    return await single_flight.run(key, compute)
+
+class SessionWrite(NamedTuple):
+    """Session and exercise log documents one request wants to write for a user"""
+    user_id: str
+    sessions: List[dict]
+    exercise_logs: List[dict]
+
+class SessionWriteResult(NamedTuple):
+    """What became of one SessionWrite"""
+    user: dict  # the user's pointer and schedule fields as of the write, for advance_workout_pointer
+    sessions: List[dict]  # newly created
+    exercise_logs: List[dict]  # logs of the new sessions
+    conflicts: List[dict]  # sessions not written because that workout was already logged differently that day
+
+class PendingSessionWrite(NamedTuple):
+    write: SessionWrite
+    committed: asyncio.Future
+
+class SessionWriteQueue:
+    """Write-behind queue that group-commits session writes across users every few milliseconds"""
+    
+    def __init__(self, max_size: int, max_delay_seconds: float, max_documents: int):
+        self.queue = asyncio.Queue(max_size)
+        self.max_delay_seconds = max_delay_seconds
+        self.max_documents = max_documents
+        self.pending = {}  # user_id -> futures of that user's uncommitted writes
+        self.wakeup = asyncio.Event()
+        self.flush_requested = False
+        self.task = None
+        self.batches = 0
+        self.committed_sessions = 0
+        self.failed_sessions = 0
+        self.conflicting_sessions = 0
+        self.largest_batch = 0
+    
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+    
+    async def enqueue(self, user_id: str, sessions: List[dict], exercise_logs: List[dict]):
+        """Queue a write, waiting for room when the queue is full"""
+        committed = asyncio.get_running_loop().create_future()
+        self.pending.setdefault(user_id, []).append(committed)
+        try:
+            await self.queue.put(PendingSessionWrite(SessionWrite(user_id, sessions, exercise_logs), committed))
+        except BaseException:
+            # Cancelled while waiting for room; the write was never queued
+            self.forget(user_id, committed)
+            raise
+        self.wakeup.set()
+    
+    def forget(self, user_id: str, committed: asyncio.Future):
+        futures = self.pending[user_id]
+        futures.remove(committed)
+        if not futures:
+            del self.pending[user_id]
+    
+    async def flush_user(self, user_id: str):
+        """Commit the user's queued writes now and wait for them, so the user reads their own writes"""
+        futures = list(self.pending.get(user_id, ()))
+        if not futures:
+            return
+        self.flush_requested = True
+        self.wakeup.set()
+        # asyncio.wait, unlike gather, leaves the futures alone if this request is cancelled
+        await asyncio.wait(futures)
+    
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            documents = len(batch[0].write.sessions) + len(batch[0].write.exercise_logs)
+            deadline = loop.time() + self.max_delay_seconds
+            while True:
+                # Cleared before draining, so a write or flush request arriving afterwards wakes the wait below
+                self.wakeup.clear()
+                while documents < self.max_documents and not self.queue.empty():
+                    pending = self.queue.get_nowait()
+                    batch.append(pending)
+                    documents += len(pending.write.sessions) + len(pending.write.exercise_logs)
+                if documents >= self.max_documents or self.flush_requested or loop.time() >= deadline:
+                    break
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    pass
+            self.flush_requested = False
+            await self.commit(batch)
+    
+    async def commit(self, batch: List[PendingSessionWrite]):
+        sessions = sum(len(pending.write.sessions) for pending in batch)
+        try:
+            results = await commit_session_writes([pending.write for pending in batch])
+            users = {}
+            new_sessions = {}
+            for pending, result in zip(batch, results):
+                users[pending.write.user_id] = result.user
+                new_sessions.setdefault(pending.write.user_id, []).extend(result.sessions)
+                if result.conflicts:
+                    # log_workout_session checks for conflicts before queueing, so only racing writes get here
+                    logger.warning(f"Write-behind dropped {len(result.conflicts)} conflicting sessions of user {pending.write.user_id}")
+                    self.conflicting_sessions += len(result.conflicts)
+            await asyncio.gather(*[
+                advance_workout_pointer(users[user_id], user_sessions)
+                for user_id, user_sessions in new_sessions.items()
+            ])
+            self.committed_sessions += sessions
+        except Exception:
+            # The requests were already acknowledged, so the failure can only be logged
+            logger.exception(f"Write-behind commit of {sessions} sessions failed")
+            self.failed_sessions += sessions
+        finally:
+            self.batches += 1
+            self.largest_batch = max(self.largest_batch, len(batch))
+            for pending in batch:
+                self.forget(pending.write.user_id, pending.committed)
+                pending.committed.set_result(None)
+                self.queue.task_done()
+    
+    async def close(self):
+        """Commit everything still queued, then stop the background task"""
+        if self.task is None:
+            return
+        self.flush_requested = True
+        self.wakeup.set()
+        await self.queue.join()
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+    
+    def stats(self) -> dict:
+        return {
+            "enabled": self.task is not None,
+            "queued": self.queue.qsize(),
+            "max_size": self.queue.maxsize,
+            "batches": self.batches,
+            "largest_batch": self.largest_batch,
+            "committed_sessions": self.committed_sessions,
+            "failed_sessions": self.failed_sessions,
+            "conflicting_sessions": self.conflicting_sessions
+        }
+
+session_write_queue = SessionWriteQueue(WRITE_BEHIND_QUEUE_SIZE, WRITE_BEHIND_MAX_DELAY_MS / 1000, WRITE_BEHIND_MAX_DOCUMENTS)
+
+async def flush_pending_writes(user_id: str):
+    """Dependency for reads: commit the user's write-behind queue entries before reading their data"""
+    await session_write_queue.flush_user(user_id)
+
+# Indexes matching each query shape the API issues
+MONGO_INDEXES = {
+    "users": [
+        # users.find_one({"id": ...})
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True)
+    ],
+    "workout_sessions": [
+        # find({user_id, completed}) sorted by date
+        IndexModel([("user_id", ASCENDING), ("completed", ASCENDING), ("date", ASCENDING)], name="user_completed_date"),
+        # find({user_id, sequence: {$gt}}) for /sync
+        IndexModel([("user_id", ASCENDING), ("sequence", ASCENDING)], name="user_sequence"),
+        # find({user_id}).sort(_id) for the pages of a full /sync
+        IndexModel([("user_id", ASCENDING), ("_id", ASCENDING)], name="user_id_order"),
+        # One session per workout per day, so retried writes upsert instead of duplicating;
+        # partial because sessions written before the day field existed may already repeat
+        IndexModel(
+            [("user_id", ASCENDING), ("day", ASCENDING), ("workout_type", ASCENDING), ("workout_number", ASCENDING)],
+            name="user_day_workout_unique",
+            unique=True,
+            partialFilterExpression={"day": {"$exists": True}}
+        )
+    ],
+    "exercise_logs": [
+        # find({user_id, exercise_name}).sort(workout_date)
+        IndexModel([("user_id", ASCENDING), ("exercise_name", ASCENDING), ("workout_date", ASCENDING)], name="user_exercise_date"),
+        # find({user_id}).sort(workout_date) for all-progress
+        IndexModel([("user_id", ASCENDING), ("workout_date", ASCENDING)], name="user_date"),
+        # find({user_id, sequence: {$gt}}) for /sync
+        IndexModel([("user_id", ASCENDING), ("sequence", ASCENDING)], name="user_sequence"),
+        # find({user_id}).sort(_id) for the pages of a full /sync
+        IndexModel([("user_id", ASCENDING), ("_id", ASCENDING)], name="user_id_order")
+    ],
+    "exercise_last_loads": [
+        # find_one({"user_id": ...}) when filling previous_load
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True)
+    ],
+    "idempotency_keys": [
+        # Expire remembered session writes
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=IDEMPOTENCY_KEY_TTL_SECONDS)
+    ]
+}
+
+async def ensure_indexes():
+    """Create every declared index; existing indexes with the same spec are left untouched"""
+    for collection_name, indexes in MONGO_INDEXES.items():
+        await db[collection_name].create_indexes(indexes)
+
+async def check_indexes():
+    """Report declared indexes that are missing and existing indexes with no recorded use"""
+    report = {"missing": [], "unused": []}
+    
+    for collection_name, indexes in MONGO_INDEXES.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        # Indexes created from the mongo shell can store directions as doubles (1.0)
+        existing_keys = [
+            [(field, int(direction) if isinstance(direction, float) else direction) for field, direction in info["key"]]
+            for info in existing.values()
+        ]
+        
+        for index in indexes:
+            keys = list(index.document["key"].items())
+            if keys not in existing_keys:
+                report["missing"].append(f"{collection_name}.{index.document['name']}")
+        
+        # $indexStats counts accesses since the last mongod restart
+        async for stats in collection.aggregate([{"$indexStats": {}}]):
+            if stats["name"] != "_id_" and stats["accesses"]["ops"] == 0:
+                report["unused"].append(f"{collection_name}.{stats['name']}")
+    
+    return report
+
 # API Routes
 @api_router.get("/")
 async def root():
     return {"message": "PPL Workout Tracker API", "status": "running"}
 
+@api_router.get("/stats")
+async def get_stats():
+    """In-process cache, request coalescing and write-behind counters for this server process"""
+    return {
+        "user_cache": user_cache.stats(),
+        "single_flight": single_flight.stats(),
+        "write_behind": session_write_queue.stats()
+    }
+
 @api_router.post("/users", response_model=User)
 async def create_user(user_data: UserCreate):
     user_dict = user_data.dict()
     user_obj = User(**user_dict)
-    user_dict = prepare_for_mongo(user_obj.dict())
+    user_dict = encode_document("users", user_obj.dict())
     await db.users.insert_one(user_dict)
     return user_obj
 
 @api_router.get("/users/{user_id}", response_model=User)
 async def get_user(user_id: str):
-    user = await db.users.find_one({"id": user_id})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    user = parse_from_mongo(user)
-    return User(**user)
+    profile = await get_user_profile(user_id)
+    return User(**profile.user)
 
 @api_router.post("/users/{user_id}/start-program")
 async def start_program(user_id: str):
-    user = await db.users.find_one({"id": user_id})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     start_date = datetime.now(timezone.utc)
-    await db.users.update_one(
+    user = await db.users.find_one_and_update(
         {"id": user_id},
-        {"$set": {"program_start_date": start_date.isoformat()}}
+        [
+            {"$set": {
+                "program_start_date": start_date,
+                "next_workout_index": 0,
+                "data_version": {"$add": [{"$ifNull": ["$data_version", 0]}, 1]},
+                "sync_sequence": {"$add": [{"$ifNull": ["$sync_sequence", 0]}, 1]}
+            }},
+            # Mark the profile as changed at the new sync sequence in the same update,
+            # so /sync never issues that sequence's token without the profile
+            {"$set": {"profile_sequence": "$sync_sequence"}}
+        ],
+        return_document=ReturnDocument.AFTER
     )
-    
-    return {"message": "Program started", "start_date": start_date}
-
-@api_router.get("/users/{user_id}/current-workout")
-async def get_current_workout(user_id: str):
-    user = await db.users.find_one({"id": user_id})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    user_cache.put(user_id, build_user_profile(user))
     
-    if not user.get("program_start_date"):
-        raise HTTPException(status_code=400, detail="Program not started")
-    
-    start_date = datetime.fromisoformat(user["program_start_date"].replace('Z', '+00:00'))
-    current_date = datetime.now(timezone.utc)
-    rest_day = user.get("rest_day", 0)
+    return {"message": "Program started", "start_date": start_date}
+
+def build_current_workout(profile: UserProfile, current_date: datetime, previous_loads: dict):
+    """Build today's workout (or rest day) for a user with previous loads overlaid"""
+    start_date, rest_day = profile.start_date, profile.rest_day
     
-    week, phase = get_current_week_and_phase(start_date)
+    week, phase = get_week_and_phase(start_date, current_date)
     
     # Check if today is a rest day
-    rest_weekday = (rest_day + 6) % 7
-    if current_date.weekday() == rest_weekday:
+    if current_date.weekday() == profile.rest_weekday:
         return {
             "week": week,
             "phase": phase,
@@ -422,32 +1472,9 @@ async def get_current_workout(user_id: str):
     # Get workout using simple logic (same as calendar)
     workout_type, workout_number = get_workout_for_day(start_date, current_date, rest_day)
     
-    # Handle deload weeks
-    if "deload" in phase:
-        exercises = [{"name": "Light Activity - Deload Week", "sets": 0, "reps": "Recovery"}]
-    else:
-        workout_key = f"{workout_type}{workout_number}"
-        exercises = WORKOUT_PROGRAM[phase]["workouts"].get(workout_key, [])
-    
-    # Get previous session data for this exercise
-    previous_session = await db.workout_sessions.find_one(
-        {
-            "user_id": user_id,
-            "workout_type": workout_type,
-            "workout_number": workout_number
-        },
-        sort=[("date", -1)]
-    )
-    
-    # Add previous loads to exercises
-    for exercise in exercises:
-        previous_load = None
-        if previous_session:
-            for prev_ex in previous_session.get("exercises", []):
-                if prev_ex.get("name") == exercise["name"]:
-                    previous_load = prev_ex.get("load")
-                    break
-        exercise["previous_load"] = previous_load
+    # Overlay previous loads on the workout template (deload weeks get light activity)
+    template = get_workout_template(phase, f"{workout_type}{workout_number}")
+    exercises = build_exercises(template, previous_loads)
     
     return {
         "week": week,
@@ -459,43 +1486,33 @@ async def get_current_workout(user_id: str):
         "is_rest_day": False
     }
 
-@api_router.get("/users/{user_id}/calendar")
-async def get_workout_calendar(user_id: str, days: int = 30):
-    user = await db.users.find_one({"id": user_id})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    if not user.get("program_start_date"):
-        raise HTTPException(status_code=400, detail="Program not started")
-    
-    start_date = datetime.fromisoformat(user["program_start_date"].replace('Z', '+00:00'))
-    rest_day = user.get("rest_day", 0)
+async def load_current_workout(user_id: str):
+    profile = await get_started_profile(user_id)
+    previous_loads = previous_loads_by_id(await get_last_loads(user_id))
+    return build_current_workout(profile, datetime.now(timezone.utc), previous_loads)
+
+# user_data_etag also reads the data version that coalesce_request keys on, so it costs no extra lookup
+@api_router.get("/users/{user_id}/current-workout", dependencies=[Depends(user_data_etag)])
+async def get_current_workout(user_id: str, request: Request):
+    return await coalesce_request(request, user_id, lambda: load_current_workout(user_id))
+
+async def get_completed_workout_keys(user_id: str) -> set:
+    """Get "<date>_<workout key>" for every completed session of the user"""
+    completed_keys = set()
+    async for session in db.workout_sessions.find(
+        {"user_id": user_id, "completed": True},
+        {"_id": 0, "date": 1, "workout_type": 1, "workout_number": 1}
+    ):
+        completed_keys.add(session_completion_key(session["date"], session["workout_type"], session["workout_number"]))
+    return completed_keys
+
+def build_calendar_entries(start_date: datetime, rest_day: int, first_date: datetime, days: int, completed_keys: set):
+    """Build calendar rows with completion status for `days` consecutive days from first_date"""
     calendar_data = []
     
-    # Get completed workout sessions for completion status
-    completed_sessions = await db.workout_sessions.find(
-        {"user_id": user_id, "completed": True}
-    ).to_list(None)
-    
-    completed_dates = set()
-    for session in completed_sessions:
-        session_date = session["date"] if isinstance(session["date"], datetime) else datetime.fromisoformat(session["date"].replace('Z', '+00:00'))
-        workout_key = f"{session_date.date()}_{session['workout_type']}{session['workout_number']}"
-        completed_dates.add(workout_key)
-    
-    for i in range(days):
-        target_date = datetime.now(timezone.utc) + timedelta(days=i)
-        week, phase = get_current_week_and_phase(start_date)
-        
-        # Use simple workout calculation for calendar planning
-        workout_type, workout_number = get_workout_for_day(start_date, target_date, rest_day)
-        
-        # Check if this workout is completed
-        workout_key = f"{target_date.date()}_{workout_type}{workout_number}"
-        is_completed = workout_key in completed_dates
-        
-        # Check if it's a rest day  
-        if workout_type == "rest":
+    for target_date, week, phase, workout_key, is_rest in iter_schedule(start_date, first_date, days, rest_day):
+        # Check if it's a rest day
+        if is_rest:
             calendar_data.append({
                 "date": target_date,
                 "week": week,
@@ -507,6 +1524,7 @@ async def get_workout_calendar(user_id: str, days: int = 30):
                 "is_completed": False
             })
         else:
+            workout_type, workout_number = split_workout_key(workout_key)
             calendar_data.append({
                 "date": target_date,
                 "week": week,
@@ -515,24 +1533,70 @@ async def get_workout_calendar(user_id: str, days: int = 30):
                 "workout_number": workout_number,
                 "workout_name": f"{workout_type.title()}{workout_number}" if "deload" not in phase else "Deload",
                 "is_rest_day": False,
-                "is_completed": is_completed
+                "is_completed": f"{target_date.date()}_{workout_key}" in completed_keys
             })
     
     return calendar_data
 
-@api_router.post("/users/{user_id}/workout-session")
-async def log_workout_session(user_id: str, session_data: WorkoutSessionCreate):
+async def load_calendar(user_id: str, days: int):
+    profile = await get_started_profile(user_id)
+    start_date, rest_day = profile.start_date, profile.rest_day
+    
+    completed_keys = await get_completed_workout_keys(user_id)
+    return build_calendar_entries(start_date, rest_day, datetime.now(timezone.utc), days, completed_keys)
+
+@api_router.get("/users/{user_id}/calendar", dependencies=[Depends(user_data_etag)])
+async def get_workout_calendar(user_id: str, request: Request, days: int = 30):
+    return await coalesce_request(request, user_id, lambda: load_calendar(user_id, days))
+
+# Longest range /schedule will build in one request (two years)
+MAX_SCHEDULE_DAYS = 731
+
+@api_router.get("/users/{user_id}/schedule", dependencies=[Depends(user_data_etag)])
+async def get_workout_schedule(user_id: str, start: str, end: str):
+    """Get calendar rows for an arbitrary past or future range (format: YYYY-MM-DD, inclusive)"""
+    profile = await get_started_profile(user_id)
+    
+    try:
+        range_start = datetime.fromisoformat(f"{start}T00:00:00+00:00").date()
+        range_end = datetime.fromisoformat(f"{end}T00:00:00+00:00").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    
+    days = (range_end - range_start).days + 1
+    if days < 1:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    if days > MAX_SCHEDULE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {MAX_SCHEDULE_DAYS} days")
+    
+    start_date, rest_day = profile.start_date, profile.rest_day
+    
+    # Use the same time of day as the calendar so both agree on every date
+    current_date = datetime.now(timezone.utc)
+    first_date = current_date + timedelta(days=(range_start - current_date.date()).days)
+    
+    completed_keys = await get_completed_workout_keys(user_id)
+    return build_calendar_entries(start_date, rest_day, first_date, days, completed_keys)
+
+def build_session_documents(user_id: str, session_data: WorkoutSessionCreate):
+    """Build the completed session document and one exercise log document per loaded exercise"""
+    # Logs, sequences and the workout pointer all go to the path's user, so the session must too
+    if session_data.user_id != user_id:
+        raise HTTPException(status_code=400, detail="Session user_id does not match the URL")
     session_dict = session_data.dict()
     session_dict["completed"] = True  # Mark as completed when logged
     session_obj = WorkoutSession(**session_dict)
-    session_dict = prepare_for_mongo(session_obj.dict())
-    await db.workout_sessions.insert_one(session_dict)
+    session_dict = encode_document("workout_sessions", session_obj.dict())
+    # UTC day the session counts for; part of the unique workout-per-day key
+    session_dict["day"] = session_dict["date"].date().isoformat()
     
     # Log individual exercises
+    exercise_logs = []
     for exercise in session_data.exercises:
         if exercise.load:
             exercise_log = ExerciseLog(
                 user_id=user_id,
+                session_id=session_obj.id,
                 exercise_name=exercise.name,
                 load=exercise.load,
                 sets=exercise.sets,
@@ -540,53 +1604,414 @@ async def log_workout_session(user_id: str, session_data: WorkoutSessionCreate):
                 workout_date=session_data.date,
                 workout_type=session_data.workout_type
             )
-            exercise_dict = prepare_for_mongo(exercise_log.dict())
-            await db.exercise_logs.insert_one(exercise_dict)
+            exercise_logs.append(encode_document("exercise_logs", exercise_log.dict()))
     
-    return {"message": "Workout session logged"}
+    return session_dict, exercise_logs
 
-@api_router.get("/users/{user_id}/upcoming-workouts")
-async def get_upcoming_workouts(user_id: str, days: int = 7):
-    """Get upcoming workouts for the next few days"""
-    user = await db.users.find_one({"id": user_id})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+def session_identity(session: dict) -> dict:
+    """Filter matching the user_day_workout_unique index for a session document"""
+    return {
+        "user_id": session["user_id"],
+        "day": session["day"],
+        "workout_type": session["workout_type"],
+        "workout_number": session["workout_number"]
+    }
+
+def session_key(session: dict) -> tuple:
+    """Hashable form of session_identity, minus the user"""
+    return (session["day"], WorkoutType(session["workout_type"]).value, session["workout_number"])
+
+# Fields a client submits for a session; a repeat with other values is an edit, not a retry
+SESSION_CONTENT_FIELDS = ("week", "phase", "exercises", "date")
+
+def same_session_content(stored: dict, session: dict) -> bool:
+    """Whether a stored session already holds what a repeated write submitted"""
+    for field in SESSION_CONTENT_FIELDS:
+        stored_value, value = stored.get(field), session.get(field)
+        if field == "date":
+            stored_value, value = parse_datetime(stored_value), parse_datetime(value)
+            # BSON dates keep milliseconds only
+            value = value.replace(microsecond=value.microsecond // 1000 * 1000)
+        if stored_value != value:
+            return False
+    return True
+
+# A write whose sync sequence has been pending this long is assumed to have died before releasing it
+SYNC_PENDING_TIMEOUT_SECONDS = 60
+
+# Fields of the user document that session writes need back from the sequence reservation
+RESERVED_USER_FIELDS = {"_id": 0, "id": 1, "sync_sequence": 1, "program_start_date": 1, "rest_day": 1, "next_workout_index": 1}
+
+async def reserve_sync_sequence(user_id: str, mongo_session=None) -> dict:
+    """Increment the user's sync sequence, which /sync uses to find their new documents, and return the user.
     
-    if not user.get("program_start_date"):
-        raise HTTPException(status_code=400, detail="Program not started")
+    The sequence stays in pending_sequences until release_sync_sequences, so /sync never issues
+    a token past documents that are still being written.
+    """
+    now = datetime.now(timezone.utc)
+    user = await db.users.find_one_and_update(
+        {"id": user_id},
+        [
+            {"$set": {"sync_sequence": {"$add": [{"$ifNull": ["$sync_sequence", 0]}, 1]}}},
+            {"$set": {"pending_sequences": {"$concatArrays": [
+                # Drop entries left behind by writers that died before releasing them
+                {"$filter": {
+                    "input": {"$ifNull": ["$pending_sequences", []]},
+                    "cond": {"$gt": ["$$this.reserved_at", now - timedelta(seconds=SYNC_PENDING_TIMEOUT_SECONDS)]}
+                }},
+                [{"sequence": "$sync_sequence", "reserved_at": now}]
+            ]}}}
+        ],
+        RESERVED_USER_FIELDS,
+        return_document=ReturnDocument.AFTER,
+        session=mongo_session
+    )
+    return user or {"id": user_id, "sync_sequence": 0}
+
+async def reserve_sync_sequences(user_ids: List[str], mongo_session=None) -> Dict[str, dict]:
+    if mongo_session is not None:
+        # Operations in one transaction cannot run concurrently
+        return {user_id: await reserve_sync_sequence(user_id, mongo_session) for user_id in user_ids}
+    users = await asyncio.gather(*[reserve_sync_sequence(user_id) for user_id in user_ids])
+    return dict(zip(user_ids, users))
+
+async def release_sync_sequences(users: Dict[str, dict], updated_user_ids, mongo_session=None):
+    """Drop the reserved sync sequences from pending_sequences and bump the data version of users whose data changed"""
+    operations = []
+    for user_id, user in users.items():
+        update = {"$pull": {"pending_sequences": {"sequence": user["sync_sequence"]}}}
+        if user_id in updated_user_ids:
+            # Only now that the documents exist, so an ETag for the new version always covers them
+            update["$inc"] = {"data_version": 1}
+        operations.append(UpdateOne({"id": user_id}, update))
+    await db.users.bulk_write(operations, ordered=False, session=mongo_session)
+
+async def commit_session_writes(writes: List[SessionWrite]):
+    """Write the sessions and logs of many writes, possibly for different users, with one bulk command per collection.
     
-    start_date = datetime.fromisoformat(user["program_start_date"].replace('Z', '+00:00'))
-    rest_day = user.get("rest_day", 0)
-    upcoming_workouts = []
+    Sessions are upserted, so a workout already logged for that day is skipped with its logs.
+    Skipped sessions whose content differs from the stored one are returned as conflicts rather than applied.
+    """
+    user_ids = list(dict.fromkeys(session_write.user_id for session_write in writes))
     
-    for i in range(days):
-        target_date = datetime.now(timezone.utc) + timedelta(days=i)
-        week, phase = get_current_week_and_phase(start_date)
-        workout_type, workout_number = get_workout_for_day(start_date, target_date, rest_day)
+    async def write_documents(users: Dict[str, dict], mongo_session=None):
+        sessions = []
+        for session_write in writes:
+            for document in session_write.sessions + session_write.exercise_logs:
+                document["sequence"] = users[session_write.user_id]["sync_sequence"]
+            sessions.extend(session_write.sessions)
         
-        if workout_type != "rest":
-            # Get exercises for this workout
-            if "deload" in phase:
-                exercises = [{"name": "Light Activity - Deload Week", "sets": 0, "reps": "Recovery"}]
-            else:
-                workout_key = f"{workout_type}{workout_number}"
-                exercises = WORKOUT_PROGRAM[phase]["workouts"].get(workout_key, [])
-            
-            # Get previous session data
-            previous_session = await db.workout_sessions.find_one(
-                {"user_id": user_id, "workout_type": workout_type, "workout_number": workout_number},
-                sort=[("date", -1)]
+        # $setOnInsert keeps the first write of a workout, so retries and replays change nothing
+        result = await db.workout_sessions.bulk_write(
+            [UpdateOne(session_identity(session), {"$setOnInsert": session}, upsert=True) for session in sessions],
+            session=mongo_session
+        )
+        new_session_ids = {sessions[index]["id"] for index in result.upserted_ids}
+        
+        # A skipped session is a retry when the stored one matches it, and a conflicting edit otherwise
+        existing = [session for session in sessions if session["id"] not in new_session_ids]
+        stored_sessions = {}
+        if existing:
+            async for stored in db.workout_sessions.find(
+                {"$or": [session_identity(session) for session in existing]},
+                {"_id": 0},
+                session=mongo_session
+            ):
+                stored_sessions[(stored["user_id"], *session_key(stored))] = stored
+        conflict_ids = set()
+        for session in existing:
+            stored = stored_sessions.get((session["user_id"], *session_key(session)))
+            if stored is None or not same_session_content(stored, session):
+                conflict_ids.add(session["id"])
+        
+        results = []
+        new_logs = []
+        last_load_writes = []
+        for session_write in writes:
+            write_sessions = [session for session in session_write.sessions if session["id"] in new_session_ids]
+            write_logs = [log for log in session_write.exercise_logs if log["session_id"] in new_session_ids]
+            write_conflicts = [session for session in session_write.sessions if session["id"] in conflict_ids]
+            results.append(SessionWriteResult(users[session_write.user_id], write_sessions, write_logs, write_conflicts))
+            new_logs.extend(write_logs)
+            last_load_writes.extend(last_load_updates(session_write.user_id, write_logs))
+        
+        if new_logs:
+            await db.exercise_logs.insert_many(new_logs, ordered=False, session=mongo_session)
+            await db.exercise_last_loads.bulk_write(last_load_writes, session=mongo_session)
+        return results
+    
+    async def write(mongo_session=None):
+        users = await reserve_sync_sequences(user_ids, mongo_session)
+        try:
+            results = await write_documents(users, mongo_session)
+        except BaseException:
+            if mongo_session is None:
+                # Whatever was written before the failure still has to reach /sync and invalidate cached responses
+                await release_sync_sequences(users, user_ids)
+            raise
+        # Invalidates the ETags of the users' schedule and progress responses
+        updated_user_ids = {session_write.user_id for session_write, result in zip(writes, results) if result.sessions}
+        await release_sync_sequences(users, updated_user_ids, mongo_session)
+        return results
+    
+    if MONGO_TRANSACTIONS:
+        # Sessions and logs commit together, so a failure never leaves partial logs behind;
+        # with_transaction retries on WriteConflict, which concurrent writes to the same user document raise
+        async with await client.start_session() as mongo_session:
+            return await mongo_session.with_transaction(write)
+    return await write()
+
+async def insert_session_documents(user_id: str, sessions: List[dict], exercise_logs: List[dict]) -> SessionWriteResult:
+    """Write one user's sessions and logs; returns the new sessions and logs and the conflicting sessions"""
+    results = await commit_session_writes([SessionWrite(user_id, sessions, exercise_logs)])
+    return results[0]
+
+async def run_idempotent(request: Request, user_id: str, handler):
+    """Run a session write once per Idempotency-Key, replaying the stored response for retries"""
+    key = request.headers.get("idempotency-key")
+    if not key:
+        return await handler()
+    if len(key) > 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key is limited to 255 characters")
+    
+    key_id = f"{user_id}:{key}"
+    request_hash = hashlib.sha256(await request.body()).hexdigest()
+    stored = await db.idempotency_keys.find_one({"_id": key_id})
+    if stored:
+        if stored["request_hash"] != request_hash:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        return FastJSONResponse(stored["response"], headers={"Idempotent-Replayed": "true"})
+    
+    response = await handler()
+    try:
+        await db.idempotency_keys.insert_one({
+            "_id": key_id,
+            "request_hash": request_hash,
+            "response": response,
+            "created_at": datetime.now(timezone.utc)
+        })
+    except DuplicateKeyError:
+        # A concurrent retry got there first; the unique session index kept the data single
+        pass
+    return response
+
+def session_conflict(sessions: List[dict]) -> HTTPException:
+    """409 for sessions that repeat an already logged workout with different content"""
+    return HTTPException(status_code=409, detail={
+        "message": "A different session was already logged for this workout on that day",
+        "conflicts": [
+            {"day": session["day"], "workout_type": session["workout_type"], "workout_number": session["workout_number"]}
+            for session in sessions
+        ]
+    })
+
+@api_router.post("/users/{user_id}/workout-session")
+async def log_workout_session(user_id: str, session_data: WorkoutSessionCreate, request: Request):
+    async def write():
+        session_dict, exercise_logs = build_session_documents(user_id, session_data)
+        if WRITE_BEHIND:
+            # The queue cannot refuse a write it has acknowledged, so check against the stored session first
+            await flush_pending_writes(user_id)
+            stored = await db.workout_sessions.find_one(session_identity(session_dict), {"_id": 0})
+            if stored:
+                if not same_session_content(stored, session_dict):
+                    raise session_conflict([session_dict])
+                return {"message": "Workout session logged", "created": False}
+            await session_write_queue.enqueue(user_id, [session_dict], exercise_logs)
+            # Nothing is stored for this workout yet, so the queued write creates it
+            return {"message": "Workout session logged", "created": True}
+        result = await insert_session_documents(user_id, [session_dict], exercise_logs)
+        if result.conflicts:
+            raise session_conflict(result.conflicts)
+        await advance_workout_pointer(result.user, result.sessions)
+        return {"message": "Workout session logged", "created": bool(result.sessions)}
+    
+    return await run_idempotent(request, user_id, write)
+
+# Most sessions accepted by one batch request
+MAX_SESSION_BATCH = 500
+
+@api_router.post("/users/{user_id}/workout-sessions:batch")
+async def log_workout_sessions_batch(user_id: str, sessions_data: List[WorkoutSessionCreate], request: Request):
+    """Log many workout sessions at once, e.g. when a client catches up after being offline"""
+    if not sessions_data:
+        raise HTTPException(status_code=400, detail="No workout sessions provided")
+    if len(sessions_data) > MAX_SESSION_BATCH:
+        raise HTTPException(status_code=400, detail=f"Batch is limited to {MAX_SESSION_BATCH} sessions")
+    
+    async def write():
+        sessions = []
+        exercise_logs = []
+        for session_data in sessions_data:
+            session_dict, session_logs = build_session_documents(user_id, session_data)
+            sessions.append(session_dict)
+            exercise_logs.extend(session_logs)
+        
+        result = await insert_session_documents(user_id, sessions, exercise_logs)
+        await advance_workout_pointer(result.user, result.sessions)
+        if result.conflicts:
+            # The other sessions are written, so retrying the corrected batch only adds what is missing
+            raise session_conflict(result.conflicts)
+        return {"message": "Workout sessions logged", "count": len(sessions), "created": len(result.sessions)}
+    
+    return await run_idempotent(request, user_id, write)
+
+# Rows validated and written per bulk write by the history import
+IMPORT_BATCH_SIZE = 1000
+# Row errors listed in an import report; later ones are only counted
+MAX_IMPORT_ERRORS = 1000
+
+async def iter_upload_lines(request: Request):
+    """Yield (line number, bytes) for each line of the request body as it streams in"""
+    buffer = b""
+    line_number = 0
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            yield line_number, line
+    if buffer:
+        yield line_number + 1, buffer
+
+async def iter_import_rows(request: Request, import_format: ImportFormat):
+    """Yield (line number, fields) for each data line of a CSV or NDJSON upload, with an error message instead of fields for unreadable lines"""
+    header = None
+    async for line_number, line in iter_upload_lines(request):
+        try:
+            text = line.decode("utf-8-sig" if line_number == 1 else "utf-8").rstrip("\r")
+        except UnicodeDecodeError:
+            yield line_number, "Line is not valid UTF-8"
+            continue
+        if not text.strip():
+            continue
+        
+        if import_format == ImportFormat.CSV:
+            # Quoted fields cannot span lines
+            values = next(csv.reader([text]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            # Empty cells count as missing, so optional columns can be left blank
+            yield line_number, {name: value for name, value in zip(header, values) if value != ""}
+        else:
+            try:
+                fields = orjson.loads(text)
+            except orjson.JSONDecodeError as e:
+                yield line_number, f"Invalid JSON: {e}"
+                continue
+            yield line_number, fields if isinstance(fields, dict) else "Expected a JSON object"
+
+def describe_validation_error(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}" for detail in error.errors())
+
+async def import_history(user_id: str, profile: UserProfile, rows) -> dict:
+    """Validate uploaded rows, group consecutive rows of the same workout into sessions and write them in batches"""
+    report = {"rows": 0, "imported_rows": 0, "sessions": 0, "exercise_logs": 0, "duplicate_sessions": 0, "conflicting_sessions": 0, "error_count": 0, "errors": []}
+    pending = []
+    pending_rows = 0
+    current_key = None
+    current_session = None
+    
+    def add_error(row_number: int, message: str):
+        report["error_count"] += 1
+        if len(report["errors"]) < MAX_IMPORT_ERRORS:
+            report["errors"].append({"row": row_number, "error": message})
+    
+    async def write(sessions_data: List[WorkoutSessionCreate]):
+        sessions = []
+        exercise_logs = []
+        for session_data in sessions_data:
+            session_dict, session_logs = build_session_documents(user_id, session_data)
+            sessions.append(session_dict)
+            exercise_logs.extend(session_logs)
+        result = await insert_session_documents(user_id, sessions, exercise_logs)
+        await advance_workout_pointer(result.user, result.sessions)
+        report["sessions"] += len(result.sessions)
+        report["exercise_logs"] += len(result.exercise_logs)
+        # Workouts already logged for that day, e.g. when a file is imported twice
+        report["duplicate_sessions"] += len(sessions) - len(result.sessions) - len(result.conflicts)
+        # Workouts already logged that day with other exercises or loads; the stored session is kept
+        report["conflicting_sessions"] += len(result.conflicts)
+    
+    async for row_number, fields in rows:
+        report["rows"] += 1
+        if isinstance(fields, str):
+            add_error(row_number, fields)
+            continue
+        try:
+            row = ImportRow(**fields)
+            exercise = Exercise(name=row.exercise_name, sets=row.sets, reps=row.reps, load=row.load)
+        except ValidationError as error:
+            add_error(row_number, describe_validation_error(error))
+            continue
+        
+        row_date = parse_datetime(row.date)
+        week, phase = row.week, row.phase
+        if week is None or phase is None:
+            if not profile.start_date:
+                add_error(row_number, "week and phase are required until the program has been started")
+                continue
+            derived_week, derived_phase = get_week_and_phase(profile.start_date, row_date)
+            week = derived_week if week is None else week
+            phase = derived_phase if phase is None else phase
+        
+        # Consecutive rows with the same date and workout form one session
+        key = (row_date, row.workout_type, row.workout_number)
+        if key != current_key:
+            if current_session is not None:
+                pending.append(current_session)
+                # Only write at a session boundary, so a session never splits across batches
+                if pending_rows >= IMPORT_BATCH_SIZE:
+                    await write(pending)
+                    pending = []
+                    pending_rows = 0
+            current_key = key
+            current_session = WorkoutSessionCreate(
+                user_id=user_id,
+                workout_type=row.workout_type,
+                workout_number=row.workout_number,
+                week=week,
+                phase=phase,
+                exercises=[],
+                date=row_date
             )
+        current_session.exercises.append(exercise)
+        pending_rows += 1
+        report["imported_rows"] += 1
+    
+    if current_session is not None:
+        pending.append(current_session)
+    if pending:
+        await write(pending)
+    
+    return report
+
+@api_router.post("/users/{user_id}/import")
+async def import_workout_history(user_id: str, request: Request, format: Optional[ImportFormat] = None):
+    """Import a training history uploaded as CSV (with a header row) or NDJSON, one exercise per row.
+    
+    Rows of the same workout must be consecutive. Valid rows are imported even when others fail;
+    the response lists each rejected row with its line number.
+    """
+    profile = await get_user_profile(user_id)
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = ImportFormat.NDJSON if "ndjson" in content_type or "jsonl" in content_type else ImportFormat.CSV
+    
+    return await import_history(user_id, profile, iter_import_rows(request, format))
+
+def build_upcoming_workouts(start_date: datetime, rest_day: int, first_date: datetime, days: int, previous_loads: dict):
+    """Build the training days among the next `days` days with previous loads overlaid"""
+    upcoming_workouts = []
+    
+    schedule = iter_schedule(start_date, first_date, days, rest_day)
+    for i, (target_date, week, phase, workout_key, is_rest) in enumerate(schedule):
+        if not is_rest:
+            workout_type, workout_number = split_workout_key(workout_key)
             
-            # Add previous loads
-            for exercise in exercises:
-                previous_load = None
-                if previous_session:
-                    for prev_ex in previous_session.get("exercises", []):
-                        if prev_ex.get("name") == exercise["name"]:
-                            previous_load = prev_ex.get("load")
-                            break
-                exercise["previous_load"] = previous_load
+            # Get exercises for this workout with previous loads
+            exercises = build_exercises(get_workout_template(phase, workout_key), previous_loads)
             
             upcoming_workouts.append({
                 "date": target_date,
@@ -601,15 +2026,23 @@ async def get_upcoming_workouts(user_id: str, days: int = 7):
     
     return upcoming_workouts
 
-@api_router.get("/users/{user_id}/workout/{date}")
+async def load_upcoming_workouts(user_id: str, days: int):
+    profile = await get_started_profile(user_id)
+    
+    # One lookup covers the previous loads of every workout in the range
+    previous_loads = previous_loads_by_id(await get_last_loads(user_id))
+    
+    return build_upcoming_workouts(profile.start_date, profile.rest_day, datetime.now(timezone.utc), days, previous_loads)
+
+@api_router.get("/users/{user_id}/upcoming-workouts", dependencies=[Depends(user_data_etag)])
+async def get_upcoming_workouts(user_id: str, request: Request, days: int = 7):
+    """Get upcoming workouts for the next few days"""
+    return await coalesce_request(request, user_id, lambda: load_upcoming_workouts(user_id, days))
+
+@api_router.get("/users/{user_id}/workout/{date}", dependencies=[Depends(flush_pending_writes)])
 async def get_workout_for_date(user_id: str, date: str):
     """Get workout for a specific date (format: YYYY-MM-DD)"""
-    user = await db.users.find_one({"id": user_id})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    if not user.get("program_start_date"):
-        raise HTTPException(status_code=400, detail="Program not started")
+    profile = await get_started_profile(user_id)
     
     try:
         # Parse requested date
@@ -625,10 +2058,9 @@ async def get_workout_for_date(user_id: str, date: str):
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
     
-    start_date = datetime.fromisoformat(user["program_start_date"].replace('Z', '+00:00'))
-    rest_day = user.get("rest_day", 0)
+    start_date, rest_day = profile.start_date, profile.rest_day
     
-    week, phase = get_current_week_and_phase(start_date)
+    week, phase = get_week_and_phase(start_date, target_date)
     workout_type, workout_number = get_workout_for_day(start_date, target_date, rest_day)
     
     # Check if it's a rest day
@@ -643,32 +2075,9 @@ async def get_workout_for_date(user_id: str, date: str):
             "is_rest_day": True
         }
     
-    # Handle deload weeks
-    if "deload" in phase:
-        exercises = [{"name": "Light Activity - Deload Week", "sets": 0, "reps": "Recovery"}]
-    else:
-        workout_key = f"{workout_type}{workout_number}"
-        exercises = WORKOUT_PROGRAM[phase]["workouts"].get(workout_key, [])
-    
-    # Get previous session data for this exercise
-    previous_session = await db.workout_sessions.find_one(
-        {
-            "user_id": user_id,
-            "workout_type": workout_type,
-            "workout_number": workout_number
-        },
-        sort=[("date", -1)]
-    )
-    
-    # Add previous loads to exercises
-    for exercise in exercises:
-        previous_load = None
-        if previous_session:
-            for prev_ex in previous_session.get("exercises", []):
-                if prev_ex.get("name") == exercise["name"]:
-                    previous_load = prev_ex.get("load")
-                    break
-        exercise["previous_load"] = previous_load
+    # Overlay previous loads on the workout template (deload weeks get light activity)
+    template = get_workout_template(phase, f"{workout_type}{workout_number}")
+    exercises = build_exercises(template, previous_loads_by_id(await get_last_loads(user_id)))
     
     return {
         "date": target_date,
@@ -680,67 +2089,575 @@ async def get_workout_for_date(user_id: str, date: str):
         "is_rest_day": False
     }
 
-@api_router.get("/users/{user_id}/exercise-progress/{exercise_name}")
-async def get_single_exercise_progress(user_id: str, exercise_name: str):
+# Clients opt into streamed progress rows with Accept: application/x-ndjson
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Documents pulled from Mongo (and lines flushed to the client) per batch when streaming
+PROGRESS_BATCH_SIZE = 1000
+
+PROGRESS_PROJECTION = {"_id": 0, "exercise_name": 1, "workout_date": 1, "load": 1, "sets": 1, "reps": 1}
+
+def wants_ndjson(request: Request) -> bool:
+    """Check whether the client asked for a streamed NDJSON response"""
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+async def stream_ndjson(cursor, build_row):
+    """Yield one JSON line per document, flushing a batch of lines at a time"""
+    lines = []
+    async for document in cursor:
+        lines.append(orjson.dumps(build_row(decode_document("exercise_logs", document)), option=orjson.OPT_SERIALIZE_NUMPY))
+        if len(lines) >= PROGRESS_BATCH_SIZE:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+def progress_row(log: dict) -> dict:
+    return {
+        "date": log["workout_date"],
+        "load": log["load"],
+        "sets": log["sets"],
+        "reps": log["reps"]
+    }
+
+def dated_progress_row(log: dict) -> dict:
+    row = progress_row(log)
+    row["date"] = log["workout_date"].strftime("%Y-%m-%d") if isinstance(log["workout_date"], datetime) else log["workout_date"]
+    return row
+
+def named_progress_row(log: dict) -> dict:
+    row = progress_row(log)
+    row["exercise_name"] = log["exercise_name"]
+    return row
+
+def find_progress_logs(query: dict):
+    """Cursor over a user's exercise logs in workout date order, fetched in batches"""
+    return db.exercise_logs.find(query, PROGRESS_PROJECTION).sort("workout_date", 1).batch_size(PROGRESS_BATCH_SIZE)
+
+# Reduction applied to each bucket's logs; rep_count is the first number in reps and is
+# null for AMRAP sets, which $sum and $max then skip
+PROGRESS_METRICS = {
+    ProgressMetric.MAX_LOAD: {"$max": "$load"},
+    ProgressMetric.VOLUME: {"$sum": {"$multiply": ["$load", "$sets", "$rep_count"]}},
+    # Epley estimate of the one-rep max
+    ProgressMetric.E1RM: {"$max": {"$multiply": ["$load", {"$add": [1, {"$divide": ["$rep_count", 30]}]}]}}
+}
+
+def progress_rollup_pipeline(query: dict, resolution: ProgressResolution, metric: ProgressMetric, by_exercise: bool = False):
+    """Aggregation that buckets exercise logs by day/week/month and reduces each bucket to one value"""
+    group_id = {"date": "$bucket"}
+    if by_exercise:
+        group_id["exercise_name"] = "$exercise_name"
+    
+    return [
+        {"$match": query},
+        {"$project": {
+            "exercise_name": 1,
+            "load": 1,
+            "sets": 1,
+            # $toDate also accepts ISO strings not yet migrated to BSON dates
+            "bucket": {"$dateTrunc": {
+                "date": {"$toDate": "$workout_date"},
+                "unit": resolution.value,
+                "startOfWeek": "monday"
+            }},
+            "rep_count": {"$let": {
+                "vars": {"found": {"$regexFind": {"input": "$reps", "regex": "[0-9]+"}}},
+                "in": {"$cond": [{"$eq": ["$$found", None]}, None, {"$toInt": "$$found.match"}]}
+            }}
+        }},
+        {"$group": {
+            "_id": group_id,
+            "value": PROGRESS_METRICS[metric],
+            "logs": {"$sum": 1}
+        }},
+        {"$sort": {"_id.exercise_name": 1, "_id.date": 1} if by_exercise else {"_id.date": 1}},
+        {"$project": {
+            "_id": 0,
+            "exercise_name": "$_id.exercise_name",
+            "date": "$_id.date",
+            "value": {"$round": ["$value", 2]},
+            "logs": 1
+        }}
+    ]
+
+async def get_progress_rollup(query: dict, resolution: ProgressResolution, metric: ProgressMetric, by_exercise: bool = False):
+    """Run the rollup pipeline; the result size depends on the number of buckets, not logs"""
+    pipeline = progress_rollup_pipeline(query, resolution, metric, by_exercise)
+    return await db.exercise_logs.aggregate(pipeline).to_list(None)
+
+async def get_all_progress_data(user_id: str) -> dict:
+    """Get every exercise log of the user grouped by exercise name"""
+    logs = await find_progress_logs({"user_id": user_id}).to_list(None)
+    
+    progress_by_exercise = {}
+    for log in logs:
+        log = decode_document("exercise_logs", log)
+        exercise_name = log["exercise_name"]
+        if exercise_name not in progress_by_exercise:
+            progress_by_exercise[exercise_name] = []
+        
+        progress_by_exercise[exercise_name].append(progress_row(log))
+    
+    return progress_by_exercise
+
+@api_router.get("/users/{user_id}/exercise-progress/{exercise_name}", dependencies=[Depends(user_data_etag)])
+async def get_single_exercise_progress(
+    user_id: str,
+    exercise_name: str,
+    request: Request,
+    resolution: Optional[ProgressResolution] = None,
+    metric: Optional[ProgressMetric] = None
+):
     """Get progress data for a specific exercise with dates and weights"""
-    logs = await db.exercise_logs.find(
-        {"user_id": user_id, "exercise_name": exercise_name}
-    ).sort("workout_date", 1).to_list(None)
+    if resolution or metric:
+        resolution = resolution or ProgressResolution.DAY
+        metric = metric or ProgressMetric.MAX_LOAD
+        buckets = await get_progress_rollup({"user_id": user_id, "exercise_name": exercise_name}, resolution, metric)
+        return {
+            "exercise_name": exercise_name,
+            "resolution": resolution,
+            "metric": metric,
+            "data": [
+                {"date": bucket["date"].strftime("%Y-%m-%d"), "value": bucket["value"], "logs": bucket["logs"]}
+                for bucket in buckets
+            ]
+        }
+    
+    cursor = find_progress_logs({"user_id": user_id, "exercise_name": exercise_name})
+    if wants_ndjson(request):
+        return StreamingResponse(stream_ndjson(cursor, dated_progress_row), media_type=NDJSON_MEDIA_TYPE)
+    
+    logs = await cursor.to_list(None)
     
     progress_data = []
     for log in logs:
-        log = parse_from_mongo(log)
-        progress_data.append({
-            "date": log["workout_date"].strftime("%Y-%m-%d") if isinstance(log["workout_date"], datetime) else log["workout_date"],
-            "load": log["load"],
-            "sets": log["sets"],
-            "reps": log["reps"]
-        })
+        log = decode_document("exercise_logs", log)
+        progress_data.append(dated_progress_row(log))
     
     return {
         "exercise_name": exercise_name,
         "data": progress_data
     }
 
-@api_router.get("/users/{user_id}/progress/{exercise_name}")
-async def get_exercise_progress(user_id: str, exercise_name: str):
-    logs = await db.exercise_logs.find(
-        {"user_id": user_id, "exercise_name": exercise_name}
-    ).sort("workout_date", 1).to_list(None)
+@api_router.get("/users/{user_id}/progress/{exercise_name}", dependencies=[Depends(user_data_etag)])
+async def get_exercise_progress(
+    user_id: str,
+    exercise_name: str,
+    request: Request,
+    resolution: Optional[ProgressResolution] = None,
+    metric: Optional[ProgressMetric] = None
+):
+    if resolution or metric:
+        buckets = await get_progress_rollup(
+            {"user_id": user_id, "exercise_name": exercise_name},
+            resolution or ProgressResolution.DAY,
+            metric or ProgressMetric.MAX_LOAD
+        )
+        return [
+            {"date": parse_datetime(bucket["date"]), "value": bucket["value"], "logs": bucket["logs"]}
+            for bucket in buckets
+        ]
+    
+    cursor = find_progress_logs({"user_id": user_id, "exercise_name": exercise_name})
+    if wants_ndjson(request):
+        return StreamingResponse(stream_ndjson(cursor, progress_row), media_type=NDJSON_MEDIA_TYPE)
+    
+    logs = await cursor.to_list(None)
     
     progress_data = []
     for log in logs:
-        log = parse_from_mongo(log)
-        progress_data.append({
-            "date": log["workout_date"],
-            "load": log["load"],
-            "sets": log["sets"],
-            "reps": log["reps"]
-        })
+        log = decode_document("exercise_logs", log)
+        progress_data.append(progress_row(log))
     
     return progress_data
 
-@api_router.get("/users/{user_id}/all-progress")
-async def get_all_progress(user_id: str):
-    logs = await db.exercise_logs.find(
-        {"user_id": user_id}
-    ).sort("workout_date", 1).to_list(None)
+@api_router.get("/users/{user_id}/all-progress", dependencies=[Depends(user_data_etag)])
+async def get_all_progress(
+    user_id: str,
+    request: Request,
+    resolution: Optional[ProgressResolution] = None,
+    metric: Optional[ProgressMetric] = None
+):
+    if resolution or metric:
+        buckets = await get_progress_rollup(
+            {"user_id": user_id},
+            resolution or ProgressResolution.DAY,
+            metric or ProgressMetric.MAX_LOAD,
+            by_exercise=True
+        )
+        rollup_by_exercise = {}
+        for bucket in buckets:
+            rollup_by_exercise.setdefault(bucket["exercise_name"], []).append(
+                {"date": parse_datetime(bucket["date"]), "value": bucket["value"], "logs": bucket["logs"]}
+            )
+        return rollup_by_exercise
     
-    progress_by_exercise = {}
-    for log in logs:
-        log = parse_from_mongo(log)
-        exercise_name = log["exercise_name"]
-        if exercise_name not in progress_by_exercise:
-            progress_by_exercise[exercise_name] = []
-        
-        progress_by_exercise[exercise_name].append({
-            "date": log["workout_date"],
-            "load": log["load"],
-            "sets": log["sets"],
-            "reps": log["reps"]
-        })
+    if wants_ndjson(request):
+        # Rows carry their exercise name since the grouped shape cannot be streamed
+        cursor = find_progress_logs({"user_id": user_id})
+        return StreamingResponse(stream_ndjson(cursor, named_progress_row), media_type=NDJSON_MEDIA_TYPE)
     
-    return progress_by_exercise
+    return await coalesce_request(request, user_id, lambda: get_all_progress_data(user_id))
+
+# Sections /dashboard can return; clients pick a subset with include=
+DASHBOARD_SECTIONS = ("current_workout", "calendar", "upcoming_workouts", "progress")
+
+async def load_dashboard(user_id: str, sections: List[str], calendar_days: int, upcoming_days: int):
+    profile = await get_started_profile(user_id)
+    current_date = datetime.now(timezone.utc)
+    
+    # Only the queries the requested sections need, run concurrently
+    queries = {}
+    if "current_workout" in sections or "upcoming_workouts" in sections:
+        queries["last_loads"] = get_last_loads(user_id)
+    if "calendar" in sections:
+        queries["completed_keys"] = get_completed_workout_keys(user_id)
+    if "progress" in sections:
+        queries["progress"] = get_all_progress_data(user_id)
+    results = dict(zip(queries, await asyncio.gather(*queries.values())))
+    
+    previous_loads = previous_loads_by_id(results.get("last_loads", {}))
+    dashboard = {}
+    for section in sections:
+        if section == "current_workout":
+            dashboard[section] = build_current_workout(profile, current_date, previous_loads)
+        elif section == "calendar":
+            dashboard[section] = build_calendar_entries(profile.start_date, profile.rest_day, current_date, calendar_days, results["completed_keys"])
+        elif section == "upcoming_workouts":
+            dashboard[section] = build_upcoming_workouts(profile.start_date, profile.rest_day, current_date, upcoming_days, previous_loads)
+        elif section == "progress":
+            dashboard[section] = results["progress"]
+    
+    return dashboard
+
+@api_router.get("/users/{user_id}/dashboard", dependencies=[Depends(user_data_etag)])
+async def get_dashboard(
+    user_id: str,
+    request: Request,
+    include: Optional[str] = None,
+    calendar_days: int = 30,
+    upcoming_days: int = 7
+):
+    """Get the app's launch screens in one request, sharing the user and query results between sections"""
+    sections = [section.strip() for section in include.split(",") if section.strip()] if include else list(DASHBOARD_SECTIONS)
+    unknown = [section for section in sections if section not in DASHBOARD_SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown dashboard sections: {', '.join(unknown)}")
+    
+    return await coalesce_request(
+        request, user_id, lambda: load_dashboard(user_id, sections, calendar_days, upcoming_days)
+    )
+
+# Exported columns per dataset, in file order; also the Mongo projection
+EXPORT_FIELDS = {
+    ExportDataset.WORKOUT_SESSIONS: ("id", "user_id", "date", "workout_type", "workout_number", "week", "phase", "completed", "completed_at", "exercises"),
+    ExportDataset.EXERCISE_LOGS: ("id", "user_id", "session_id", "workout_date", "workout_type", "exercise_name", "load", "sets", "reps", "created_at"),
+}
+# Date field exports are ordered by when exporting one user
+EXPORT_SORT_FIELDS = {ExportDataset.WORKOUT_SESSIONS: "date", ExportDataset.EXERCISE_LOGS: "workout_date"}
+# Documents per cursor batch, and rows per CSV/NDJSON chunk or Parquet row group
+EXPORT_BATCH_SIZE = 5000
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.NDJSON: NDJSON_MEDIA_TYPE,
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+}
+
+async def iter_export_batches(dataset: ExportDataset, user_id: Optional[str] = None):
+    """Yield lists of decoded documents for one user's (or every user's) dataset"""
+    projection = {"_id": 0, **{field: 1 for field in EXPORT_FIELDS[dataset]}}
+    cursor = db[dataset.value].find({"user_id": user_id} if user_id else {}, projection)
+    if user_id:
+        cursor = cursor.sort(EXPORT_SORT_FIELDS[dataset], 1)
+    
+    batch = []
+    async for document in cursor.batch_size(EXPORT_BATCH_SIZE):
+        batch.append(decode_document(dataset.value, document))
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        # Session exercises are nested; CSV gets them as a JSON array
+        return orjson.dumps(value).decode()
+    return "" if value is None else value
+
+async def export_csv(dataset: ExportDataset, batches):
+    fields = EXPORT_FIELDS[dataset]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    async for batch in batches:
+        writer.writerows([csv_value(document.get(field)) for field in fields] for document in batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+async def export_ndjson(dataset: ExportDataset, batches):
+    fields = EXPORT_FIELDS[dataset]
+    async for batch in batches:
+        yield b"".join(orjson.dumps({field: document.get(field) for field in fields}) + b"\n" for document in batch)
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last drain, while tell() keeps counting"""
+    
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+    
+    def tell(self):
+        return self.position
+    
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def parquet_schema(dataset: ExportDataset):
+    import pyarrow as pa
+    
+    timestamp = pa.timestamp("us", tz="UTC")
+    if dataset == ExportDataset.WORKOUT_SESSIONS:
+        exercise = pa.struct([("name", pa.string()), ("sets", pa.int64()), ("reps", pa.string()), ("load", pa.float64())])
+        columns = [
+            ("id", pa.string()), ("user_id", pa.string()), ("date", timestamp), ("workout_type", pa.string()),
+            ("workout_number", pa.int64()), ("week", pa.int64()), ("phase", pa.string()), ("completed", pa.bool_()),
+            ("completed_at", timestamp), ("exercises", pa.list_(exercise)),
+        ]
+    else:
+        columns = [
+            ("id", pa.string()), ("user_id", pa.string()), ("session_id", pa.string()), ("workout_date", timestamp), ("workout_type", pa.string()),
+            ("exercise_name", pa.string()), ("load", pa.float64()), ("sets", pa.int64()), ("reps", pa.string()),
+            ("created_at", timestamp),
+        ]
+    return pa.schema(columns)
+
+async def export_parquet(dataset: ExportDataset, batches):
+    """Write each batch as one Parquet row group and stream the file as the row groups are written"""
+    # pyarrow is only needed for Parquet exports
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    schema = parquet_schema(dataset)
+    fields = EXPORT_FIELDS[dataset]
+    sink = ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        async for batch in batches:
+            columns = {field: [document.get(field) for document in batch] for field in fields}
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+EXPORT_WRITERS = {
+    ExportFormat.CSV: export_csv,
+    ExportFormat.NDJSON: export_ndjson,
+    ExportFormat.PARQUET: export_parquet,
+}
+
+def export_history(dataset: ExportDataset, export_format: ExportFormat, user_id: Optional[str] = None):
+    """Async iterator of file chunks exporting one user's (or every user's) dataset"""
+    return EXPORT_WRITERS[export_format](dataset, iter_export_batches(dataset, user_id))
+
+@api_router.get("/users/{user_id}/export", dependencies=[Depends(flush_pending_writes)])
+async def export_user_history(
+    user_id: str,
+    dataset: ExportDataset = ExportDataset.EXERCISE_LOGS,
+    format: ExportFormat = ExportFormat.CSV
+):
+    """Download a user's sessions or exercise logs as CSV, NDJSON or Parquet"""
+    await get_user_profile(user_id)
+    filename = f"{user_id}-{dataset.value}.{format.value}"
+    return StreamingResponse(
+        export_history(dataset, format, user_id),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+class SyncPosition(NamedTuple):
+    """Where a sync token resumes: the sequence it was issued at, and for a continuation the page position"""
+    since: Optional[int]
+    until: Optional[int] = None
+    collection: int = 0
+    after_id: Optional[str] = None
+
+def encode_sync_token(sequence: int) -> str:
+    return base64.urlsafe_b64encode(f"v1:{sequence}".encode()).decode().rstrip("=")
+
+def encode_sync_continuation(position: SyncPosition) -> str:
+    since = "" if position.since is None else position.since
+    token = f"v1:{since}:{position.until}:{position.collection}:{position.after_id or ''}"
+    return base64.urlsafe_b64encode(token.encode()).decode().rstrip("=")
+
+def decode_sync_token(token: str) -> SyncPosition:
+    """Position a token was issued at; 400 for tokens this server did not issue"""
+    try:
+        version, *fields = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode().split(":")
+        if version != "v1":
+            raise ValueError(version)
+        if len(fields) == 1:
+            return SyncPosition(int(fields[0]))
+        since, until, collection, after_id = fields
+        if (after_id and not ObjectId.is_valid(after_id)) or int(collection) not in range(len(SYNC_COLLECTIONS)):
+            raise ValueError(token)
+        return SyncPosition(int(since) if since else None, int(until), int(collection), after_id or None)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+SYNC_PROFILE_FIELDS = tuple(User.model_fields)
+SYNC_COLLECTIONS = ("workout_sessions", "exercise_logs")
+
+# Documents per /sync response; clients keep following the token while has_more is set
+SYNC_PAGE_SIZE = int(os.environ.get("SYNC_PAGE_SIZE", "1000"))
+
+@api_router.get("/users/{user_id}/sync", dependencies=[Depends(flush_pending_writes)])
+async def sync_user_data(user_id: str, since: Optional[str] = None):
+    """Get the profile, sessions and exercise logs changed since a previous sync token (everything without one)"""
+    position = decode_sync_token(since) if since else SyncPosition(None)
+    since_sequence = position.since
+    user = await db.users.find_one({"id": user_id}, {"_id": 0})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    changes = {"full": since_sequence is None, "has_more": False}
+    for name in SYNC_COLLECTIONS:
+        changes[name] = []
+    if position.until is not None:
+        # Continuation of a paged sync: same range, the profile went out with the first page
+        sequence = position.until
+        changes["profile"] = None
+    else:
+        # Changes up to the sequence read here belong to this sync; later ones are left for the next
+        sequence = user.get("sync_sequence", 0)
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=SYNC_PENDING_TIMEOUT_SECONDS)
+        pending = [
+            entry["sequence"] for entry in user.get("pending_sequences", [])
+            if parse_datetime(entry["reserved_at"]) > cutoff
+        ]
+        if pending:
+            # Documents stamped with a pending sequence may not all exist yet, so stop the token before them
+            sequence = min(pending) - 1
+        if since_sequence is None or user.get("profile_sequence", 0) > since_sequence:
+            user = decode_document("users", user)
+            changes["profile"] = {field: user.get(field) for field in SYNC_PROFILE_FIELDS}
+        else:
+            changes["profile"] = None
+    changes["token"] = encode_sync_token(sequence)
+    
+    if since_sequence is not None and since_sequence >= sequence:
+        # Nothing was written since the last sync
+        return changes
+    
+    if since_sequence is None:
+        # Full sync, including documents written before sequences were stamped
+        query = {"user_id": user_id, "sequence": {"$not": {"$gt": sequence}}}
+    else:
+        query = {"user_id": user_id, "sequence": {"$gt": since_sequence, "$lte": sequence}}
+    
+    remaining = SYNC_PAGE_SIZE
+    for collection in range(position.collection, len(SYNC_COLLECTIONS)):
+        name = SYNC_COLLECTIONS[collection]
+        page_query = query
+        if collection == position.collection and position.after_id is not None:
+            page_query = dict(query, _id={"$gt": ObjectId(position.after_id)})
+        # One extra document tells whether another page follows
+        documents = await db[name].find(page_query, {"sequence": 0}).sort("_id", ASCENDING).limit(remaining + 1).to_list(None)
+        page = documents[:remaining]
+        changes[name] = [decode_document(name, {key: value for key, value in document.items() if key != "_id"}) for document in page]
+        if len(documents) > remaining:
+            changes["has_more"] = True
+            # An empty page means the previous collection filled it; resume at the start of this one
+            after_id = str(page[-1]["_id"]) if page else None
+            changes["token"] = encode_sync_continuation(SyncPosition(since_sequence, sequence, collection, after_id))
+            break
+        remaining -= len(page)
+    return changes
+
+@app.middleware("http")
+async def annotate_response(request: Request, call_next):
+    """Add the ETag chosen by user_data_etag and the request's Mongo usage to the response, and record metrics"""
+    stats = {"commands": 0, "seconds": 0.0}
+    mongo_request_stats.set(stats)
+    started = time.perf_counter()
+    response = await call_next(request)
+    
+    # Label by route template so per-user URLs share one series
+    route = request.scope.get("route")
+    route_path = route.path if route else "unmatched"
+    
+    def observe():
+        http_request_duration.observe((request.method, route_path, str(response.status_code)), time.perf_counter() - started)
+        http_request_mongo_duration.observe((request.method, route_path), stats["seconds"])
+        http_request_mongo_commands.observe((request.method, route_path), stats["commands"])
+    
+    async def observe_after_body(body_iterator):
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            observe()
+    
+    # Record once the body is sent: streamed exports and imports spend most of their time, and queries, after the headers
+    response.body_iterator = observe_after_body(response.body_iterator)
+    
+    etag = getattr(request.state, "etag", None)
+    if etag and response.status_code == 200:
+        response.headers["ETag"] = etag
+    # Report how many Mongo commands the request issued, to spot N+1 query patterns;
+    # for streamed responses this only covers the work done before the headers
+    response.headers["X-Mongo-Commands"] = str(stats["commands"])
+    response.headers["X-Mongo-Time-Ms"] = f"{stats['seconds'] * 1e3:.1f}"
+    return response
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Request and Mongo command histograms in the Prometheus text format"""
+    lines = []
+    histograms = (http_request_duration, http_request_mongo_duration, http_request_mongo_commands, mongo_command_duration, mongo_pool_wait)
+    for histogram in histograms:
+        lines.extend(histogram.render())
+    return Response("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+@app.get("/ready", include_in_schema=False)
+async def get_ready():
+    """Readiness probe: Mongo answers a ping within the deadline and the pool is not backed up"""
+    pool = pool_monitor.stats()
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(db.command("ping"), READY_TIMEOUT_SECONDS)
+        error = None
+    except asyncio.TimeoutError:
+        error = f"Mongo ping timed out after {READY_TIMEOUT_SECONDS}s"
+    except Exception as e:
+        error = f"Mongo ping failed: {e}"
+    ping_ms = round((time.perf_counter() - started) * 1e3, 3)
+    
+    if error is None and READY_MAX_POOL_WAITERS is not None and pool["waiting"] > READY_MAX_POOL_WAITERS:
+        error = f"{pool['waiting']} requests waiting for a Mongo connection"
+    
+    body = {"ready": error is None, "ping_ms": ping_ms, "pool": pool}
+    if error:
+        body["error"] = error
+    return FastJSONResponse(body, status_code=200 if error is None else 503)
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -751,6 +2668,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Mongo-Commands", "X-Mongo-Time-Ms"],
 )
 
 # Configure logging
@@ -760,6 +2678,43 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def provision_indexes():
+    if MONGO_INDEX_MODE == "create":
+        await ensure_indexes()
+    elif MONGO_INDEX_MODE == "check":
+        report = await check_indexes()
+        for name in report["unused"]:
+            logger.warning(f"Index {name} has not been used since the last mongod restart")
+        if report["missing"]:
+            raise RuntimeError(f"Missing MongoDB indexes: {', '.join(report['missing'])}")
+
+@app.on_event("startup")
+async def start_date_migration():
+    if MIGRATE_DATES_ON_STARTUP:
+        # Keep a reference so the task is not garbage collected mid-run
+        app.state.date_migration = asyncio.create_task(migrate_all_datetime_fields())
+
+@app.on_event("startup")
+async def start_pointer_backfill():
+    # Finds nothing once every started user has a pointer, so it is cheap to run on every startup
+    app.state.pointer_backfill = asyncio.create_task(backfill_workout_pointers())
+
+@app.on_event("startup")
+async def start_write_behind():
+    if WRITE_BEHIND:
+        session_write_queue.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    migration = getattr(app.state, "date_migration", None)
+    if migration and not migration.done():
+        # Progress is checkpointed per batch, so the next startup resumes from here
+        migration.cancel()
+    backfill = getattr(app.state, "pointer_backfill", None)
+    if backfill and not backfill.done():
+        # Users already backfilled have the field, so the next startup picks up the rest
+        backfill.cancel()
+    # Acknowledged sessions still in the write-behind queue must reach Mongo before the client closes
+    await session_write_queue.close()
     client.close()
\ No newline at end of file
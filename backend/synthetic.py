@@ -0,0 +1,153 @@
+"""
+Synthetic PPL Workout Tracker users and training histories for load testing.
+Histories walk the real program schedule and are deterministic for a given seed.
+"""
+
+import uuid
+import random
+from datetime import datetime, timedelta
+from typing import List, NamedTuple
+
+import server
+
+FIRST_NAMES = ["Alex", "Sam", "Jordan", "Taylor", "Morgan", "Casey", "Riley", "Jamie", "Avery", "Quinn"]
+LAST_NAMES = ["Smith", "Garcia", "Chen", "Okafor", "Novak", "Silva", "Kowalski", "Haddad", "Tanaka", "Murphy"]
+
+# Smallest plate jump in kg; every generated load is a multiple of it
+LOAD_STEP = 2.5
+
+class SyntheticHistory(NamedTuple):
+    """Documents for one user, ready for insert_many"""
+    sessions: List[dict]
+    exercise_logs: List[dict]
+    last_loads: dict
+    next_workout_index: int
+
+def user_rng(seed: int, index: int) -> random.Random:
+    """Independent generator per user, so any user can be regenerated on its own"""
+    return random.Random(f"{seed}-{index}")
+
+def synthetic_id(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+def round_load(load: float) -> float:
+    return max(LOAD_STEP, round(load / LOAD_STEP) * LOAD_STEP)
+
+def synthetic_user(rng: random.Random, start_date: datetime, rest_day: int) -> dict:
+    """A started user document as POST /users and start-program would store it"""
+    gender = rng.choice(["male", "female"])
+    return server.encode_document("users", {
+        "id": synthetic_id(rng),
+        "first_name": rng.choice(FIRST_NAMES),
+        "last_name": rng.choice(LAST_NAMES),
+        "age": rng.randint(18, 65),
+        "height": round(rng.gauss(178 if gender == "male" else 165, 7), 1),
+        "weight": round(rng.gauss(82 if gender == "male" else 66, 10), 1),
+        "gender": gender,
+        "phone": f"555{rng.randrange(10 ** 7):07d}",
+        "rest_day": rest_day,
+        "program_start_date": start_date,
+        "created_at": start_date - timedelta(days=rng.randint(0, 14)),
+        "data_version": 0,
+        "next_workout_index": 0
+    })
+
+def random_user(rng: random.Random, end_date: datetime, max_days: int) -> dict:
+    """A user with a random rest day who started the program up to max_days before end_date"""
+    start_date = end_date - timedelta(days=rng.randint(7, max_days), hours=rng.randint(0, 23), minutes=rng.randint(0, 59))
+    return synthetic_user(rng, start_date, rng.randrange(7))
+
+def synthetic_history(rng: random.Random, user: dict, end_date: datetime, miss_rate: float = 0.1) -> SyntheticHistory:
+    """Completed sessions and exercise logs for every scheduled training day the user did not miss"""
+    user_id = user["id"]
+    start_date = user["program_start_date"]
+    sessions = []
+    exercise_logs = []
+    last_loads = {}
+    # Each lifter starts somewhere different on each exercise and progresses at their own pace
+    loads = {}
+    first_loads = {}
+    progression = rng.uniform(0.25, 0.6)
+    break_days = 0
+    # Training days walked so far and the first one skipped, for the next-expected-workout pointer
+    workout_days = 0
+    first_missed = None
+    
+    days = (end_date - start_date).days
+    for target_date, week, phase, workout_key, is_rest in server.iter_schedule(start_date, start_date, days, user["rest_day"]):
+        if is_rest:
+            continue
+        workout_days += 1
+        
+        if break_days:
+            break_days -= 1
+            if not break_days:
+                # Strength fades a little over a holiday or illness
+                loads = {exercise_id: round_load(load * 0.9) for exercise_id, load in loads.items()}
+            missed = True
+        elif rng.random() < 0.004:
+            break_days = rng.randint(5, 18)
+            missed = True
+        else:
+            missed = rng.random() < miss_rate
+        if missed:
+            if first_missed is None:
+                first_missed = workout_days - 1
+            continue
+        
+        workout_type, workout_number = server.split_workout_key(workout_key)
+        session_id = synthetic_id(rng)
+        exercises = []
+        for exercise in server.get_workout_template(phase, workout_key):
+            if exercise.exercise_id < 0:
+                # Deload weeks have no loaded exercises
+                exercises.append({"name": exercise.name, "sets": exercise.sets, "reps": exercise.reps, "load": None})
+                continue
+            
+            load = loads.get(exercise.exercise_id)
+            if load is None:
+                load = round_load(rng.uniform(10, 60))
+                first_loads[exercise.exercise_id] = load
+            elif rng.random() < progression * (first_loads[exercise.exercise_id] / load) ** 2:
+                # Gains slow down as the load moves away from where the lifter started
+                load = round_load(load + LOAD_STEP)
+            elif rng.random() < 0.05:
+                load = round_load(load - LOAD_STEP)
+            loads[exercise.exercise_id] = load
+            
+            exercises.append({"name": exercise.name, "sets": exercise.sets, "reps": exercise.reps, "load": load})
+            exercise_logs.append({
+                "id": synthetic_id(rng),
+                "user_id": user_id,
+                "session_id": session_id,
+                "exercise_name": exercise.name,
+                "load": load,
+                "sets": exercise.sets,
+                "reps": exercise.reps,
+                "workout_date": target_date,
+                "workout_type": workout_type,
+                "created_at": target_date
+            })
+            last_loads[server.last_load_key(exercise.name)] = {
+                "load": load,
+                "sets": exercise.sets,
+                "reps": exercise.reps,
+                "date": target_date
+            }
+        
+        sessions.append({
+            "id": session_id,
+            "user_id": user_id,
+            "workout_type": workout_type,
+            "workout_number": workout_number,
+            "week": week,
+            "phase": phase,
+            "exercises": exercises,
+            "date": target_date,
+            "day": target_date.date().isoformat(),
+            "completed": True,
+            "completed_at": target_date + timedelta(minutes=rng.randint(40, 120))
+        })
+    
+    next_workout_index = workout_days if first_missed is None else first_missed
+    return SyntheticHistory(sessions, exercise_logs, last_loads, next_workout_index)
@@ -0,0 +1,63 @@
+"""
+Shared fixtures: the backend app and its helpers running against an in-memory MongoDB.
+"""
+
+import os
+import sys
+
+# server.py reads these at import time; the fixtures below swap in mongomock before any query runs
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "ppl_test")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import httpx
+import mongomock.aggregate
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+
+parse_basic_expression = mongomock.aggregate._Parser._parse_basic_expression
+
+def parse_array_literal(parser, expression):
+    """MongoDB evaluates the items of array literals in expressions; mongomock returns them as written"""
+    if isinstance(expression, list):
+        return [parser.parse(item) for item in expression]
+    return parse_basic_expression(parser, expression)
+
+mongomock.aggregate._Parser._parse_basic_expression = parse_array_literal
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+async def db(monkeypatch):
+    """A fresh in-memory database with the declared indexes, used by server for the test"""
+    database = AsyncMongoMockClient()["ppl_test"]
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setattr(server, "user_cache", server.UserProfileCache(server.USER_CACHE_SIZE, server.USER_CACHE_TTL_SECONDS))
+    await server.ensure_indexes()
+    return database
+
+@pytest.fixture
+async def api(db):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+        yield client
+
+@pytest.fixture
+async def user_id(api):
+    """A user who has started the program"""
+    response = await api.post("/api/users", json={
+        "first_name": "Test",
+        "last_name": "User",
+        "age": 30,
+        "height": 180,
+        "weight": 80,
+        "gender": "male",
+        "phone": "5550000000",
+        "rest_day": 0
+    })
+    user_id = response.json()["id"]
+    await api.post(f"/api/users/{user_id}/start-program")
+    return user_id
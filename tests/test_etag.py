@@ -0,0 +1,84 @@
+"""
+ETags must change whenever the data behind a response does, and a matching one must cost no history queries.
+"""
+
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+class CollectionAccessRecorder:
+    """Database stand-in that records which collections a request touched"""
+    
+    def __init__(self, database):
+        self.database = database
+        self.accessed = set()
+    
+    def __getattr__(self, name):
+        self.accessed.add(name)
+        return getattr(self.database, name)
+    
+    def __getitem__(self, name):
+        self.accessed.add(name)
+        return self.database[name]
+
+def week_params() -> dict:
+    start = datetime.now(timezone.utc).date() + timedelta(days=7)
+    return {"start": start.isoformat(), "end": (start + timedelta(days=6)).isoformat()}
+
+def rest_weekdays(rows: list) -> list:
+    return [datetime.fromisoformat(row["date"]).weekday() for row in rows if row["is_rest_day"]]
+
+async def test_matching_etag_answers_304_without_history_queries(api, db, user_id, monkeypatch):
+    await api.post(f"/api/users/{user_id}/workout-session", json={
+        "user_id": user_id,
+        "workout_type": "push",
+        "workout_number": 1,
+        "week": 1,
+        "phase": "phase1",
+        "exercises": [{"name": "Bench Press", "sets": 3, "reps": "6-8", "load": 100}],
+        "date": "2026-10-13T18:30:00Z"
+    })
+    first = await api.get(f"/api/users/{user_id}/calendar")
+    
+    recorder = CollectionAccessRecorder(db)
+    monkeypatch.setattr(server, "db", recorder)
+    second = await api.get(f"/api/users/{user_id}/calendar", headers={"If-None-Match": first.headers["etag"]})
+    
+    assert second.status_code == 304
+    assert second.headers["etag"] == first.headers["etag"]
+    assert recorder.accessed == {"users"}
+
+async def test_writes_and_start_program_change_the_etag(api, db, user_id):
+    before = await api.get(f"/api/users/{user_id}/calendar")
+    await api.post(f"/api/users/{user_id}/workout-session", json={
+        "user_id": user_id,
+        "workout_type": "push",
+        "workout_number": 1,
+        "week": 1,
+        "phase": "phase1",
+        "exercises": [{"name": "Bench Press", "sets": 3, "reps": "6-8", "load": 100}],
+        "date": datetime.now(timezone.utc).isoformat()
+    })
+    after_write = await api.get(f"/api/users/{user_id}/calendar", headers={"If-None-Match": before.headers["etag"]})
+    await api.post(f"/api/users/{user_id}/start-program")
+    after_restart = await api.get(f"/api/users/{user_id}/calendar", headers={"If-None-Match": after_write.headers["etag"]})
+    
+    assert after_write.status_code == 200
+    assert after_write.headers["etag"] != before.headers["etag"]
+    assert after_restart.status_code == 200
+    assert after_restart.headers["etag"] not in (before.headers["etag"], after_write.headers["etag"])
+
+async def test_cached_profile_older_than_the_etag_is_reloaded(api, db, user_id):
+    first = await api.get(f"/api/users/{user_id}/schedule", params=week_params())
+    assert rest_weekdays(first.json()) == [6]
+    
+    # What another process writes when the user moves their rest day; this process's cache never hears of it
+    await db.users.update_one({"id": user_id}, {"$set": {"rest_day": 1}, "$inc": {"data_version": 1}})
+    second = await api.get(f"/api/users/{user_id}/schedule", params=week_params())
+    
+    assert second.headers["etag"] != first.headers["etag"]
+    assert rest_weekdays(second.json()) == [0]
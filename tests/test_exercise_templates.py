@@ -0,0 +1,56 @@
+"""
+Exercise lists rendered from the compiled templates must equal the deep copies of WORKOUT_PROGRAM they replaced.
+"""
+
+import copy
+import random
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+import server
+
+def legacy_upcoming_exercises(schedule_rows, last_loads: dict):
+    """Exercise lists assembled from deep copies of WORKOUT_PROGRAM with a name lookup per exercise"""
+    workouts = []
+    for _, _, phase, workout_key, is_rest in schedule_rows:
+        if is_rest:
+            continue
+        if "deload" in phase:
+            exercises = [{"name": "Light Activity - Deload Week", "sets": 0, "reps": "Recovery"}]
+        else:
+            exercises = copy.deepcopy(server.WORKOUT_PROGRAM[phase]["workouts"].get(workout_key, []))
+        for exercise in exercises:
+            last_load = last_loads.get(exercise["name"])
+            exercise["previous_load"] = last_load["load"] if last_load else None
+        workouts.append(exercises)
+    return workouts
+
+def compiled_upcoming_exercises(schedule_rows, last_loads: dict):
+    previous_loads = server.previous_loads_by_id(last_loads)
+    return [
+        server.build_exercises(server.get_workout_template(phase, workout_key), previous_loads)
+        for _, _, phase, workout_key, is_rest in schedule_rows
+        if not is_rest
+    ]
+
+@pytest.mark.parametrize("seed", range(10))
+def test_compiled_templates_match_legacy_assembly(seed):
+    rng = random.Random(seed)
+    # Some exercises have never been logged, so previous_load must be None for them
+    last_loads = {
+        exercise_name: {"load": round(rng.uniform(20, 180), 1), "sets": 3, "reps": "8-10"}
+        for exercise_name in server.EXERCISE_IDS
+        if rng.random() < 0.7
+    }
+    start_date = datetime(2024, 1, 1, 6, 30, tzinfo=timezone.utc)
+    # Long enough to cover every phase, both deloads and the cycle back to phase 1
+    schedule_rows = list(server.iter_schedule(start_date, start_date + timedelta(days=rng.randrange(7)), 70, rng.randrange(7)))
+    
+    assert compiled_upcoming_exercises(schedule_rows, last_loads) == legacy_upcoming_exercises(schedule_rows, last_loads)
+
+def test_rendered_lists_are_independent():
+    schedule_rows = list(server.iter_schedule(datetime(2024, 1, 1, tzinfo=timezone.utc), datetime(2024, 1, 1, tzinfo=timezone.utc), 1, 3))
+    first = compiled_upcoming_exercises(schedule_rows, {})
+    first[0][0]["previous_load"] = 999
+    assert compiled_upcoming_exercises(schedule_rows, {})[0][0]["previous_load"] is None
@@ -0,0 +1,72 @@
+"""
+The last-load map must only move forward, survive any exercise name, and equal what a rebuild from the logs produces.
+"""
+
+import random
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+EXERCISE_NAMES = ["Bench Press", "Dr. Smith's $Press", "Curl 50% 1RM", "a.b", "a%2Eb", "$where"]
+
+def exercise_log(exercise_name: str, workout_date: datetime, load: float) -> dict:
+    return {"user_id": "u1", "exercise_name": exercise_name, "workout_date": workout_date, "load": load, "sets": 3, "reps": "8-10"}
+
+async def apply_logs(db, exercise_logs: list):
+    await db.exercise_last_loads.bulk_write(server.last_load_updates("u1", exercise_logs))
+
+async def last_loads(db) -> dict:
+    """The user's map with dates normalized, since mongomock drops their time zone"""
+    return {
+        exercise_name: dict(entry, date=server.parse_datetime(entry["date"]))
+        for exercise_name, entry in (await server.get_last_loads("u1")).items()
+    }
+
+async def test_late_and_replayed_logs_never_roll_an_entry_back(db):
+    monday = datetime(2024, 3, 4, 18, tzinfo=timezone.utc)
+    await apply_logs(db, [exercise_log("Bench Press", monday + timedelta(days=2), 110)])
+    # Logged offline on Monday, synced after Wednesday's session
+    await apply_logs(db, [exercise_log("Bench Press", monday, 100)])
+    await apply_logs(db, [exercise_log("Bench Press", monday + timedelta(days=2), 110)])
+    
+    assert (await last_loads(db))["Bench Press"]["load"] == 110
+    
+    # A correction for the same session still applies
+    await apply_logs(db, [exercise_log("Bench Press", monday + timedelta(days=2), 112.5)])
+    assert (await last_loads(db))["Bench Press"]["load"] == 112.5
+
+async def test_names_with_dots_dollars_and_percents_round_trip(db):
+    workout_date = datetime(2024, 3, 4, 18, tzinfo=timezone.utc)
+    await apply_logs(db, [exercise_log(name, workout_date, 20 + index) for index, name in enumerate(EXERCISE_NAMES)])
+    
+    document = await db.exercise_last_loads.find_one({"user_id": "u1"})
+    assert not any("." in key or key.startswith("$") for key in document["exercises"])
+    loads = await last_loads(db)
+    assert {name: entry["load"] for name, entry in loads.items()} == {name: 20 + index for index, name in enumerate(EXERCISE_NAMES)}
+
+@pytest.mark.parametrize("seed", range(5))
+async def test_rebuild_matches_incremental_writes(db, seed):
+    rng = random.Random(seed)
+    start_date = datetime(2024, 1, 1, 18, tzinfo=timezone.utc)
+    exercise_logs = []
+    for exercise_name in EXERCISE_NAMES:
+        # Distinct dates per exercise, so the newest log is never a tie
+        for day in rng.sample(range(120), rng.randrange(1, 15)):
+            exercise_logs.append(exercise_log(exercise_name, start_date + timedelta(days=day), round(rng.uniform(20, 180), 1)))
+    await db.exercise_logs.insert_many([dict(log) for log in exercise_logs])
+    
+    # Sessions arrive out of order and in batches of different sizes
+    rng.shuffle(exercise_logs)
+    while exercise_logs:
+        size = rng.randint(1, 8)
+        batch, exercise_logs = exercise_logs[:size], exercise_logs[size:]
+        await apply_logs(db, batch)
+    incremental = await last_loads(db)
+    
+    await db.exercise_last_loads.delete_many({})
+    assert await server.rebuild_last_loads("u1") == 1
+    assert await last_loads(db) == incremental
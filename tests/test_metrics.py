@@ -0,0 +1,31 @@
+"""
+Request latency histograms must cover the whole response, including streamed bodies.
+"""
+
+import asyncio
+import re
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+def duration_sum(metrics: str, route: str) -> float:
+    match = re.search(rf'http_request_duration_seconds_sum{{method="GET",route="{re.escape(route)}",status="200"}} (\S+)', metrics)
+    return float(match.group(1)) if match else 0.0
+
+async def test_streamed_response_is_timed_until_the_body_is_sent(api, user_id, monkeypatch):
+    async def slow_export(dataset, export_format, user_id=None):
+        for _ in range(3):
+            await asyncio.sleep(0.05)
+            yield b"row\n"
+    
+    monkeypatch.setattr(server, "export_history", slow_export)
+    route = "/api/users/{user_id}/export"
+    before = duration_sum((await api.get("/metrics")).text, route)
+    response = await api.get(f"/api/users/{user_id}/export")
+    after = duration_sum((await api.get("/metrics")).text, route)
+    
+    assert response.content == b"row\n" * 3
+    assert after - before >= 0.15
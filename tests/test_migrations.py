@@ -0,0 +1,93 @@
+"""
+The BSON date migration must convert only legacy date strings, resume where it stopped, and backfill session days.
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+def legacy_session(user_id: str, date, workout_type: str = "push") -> dict:
+    """A session as written before BSON dates and the day field"""
+    return {
+        "id": f"{user_id}-{workout_type}-{date}",
+        "user_id": user_id,
+        "workout_type": workout_type,
+        "workout_number": 1,
+        "week": 1,
+        "phase": "phase1",
+        "exercises": [{"name": "Bench Press", "sets": 3, "reps": "6-8", "load": 100}],
+        "date": date,
+        "completed": True,
+        "completed_at": date
+    }
+
+async def test_mixed_documents_end_up_as_bson_dates(db):
+    bson_date = datetime(2024, 3, 2, 9, 15, 30, 250000, tzinfo=timezone.utc)
+    await db.workout_sessions.insert_many([
+        legacy_session("u1", "2024-03-01T18:30:00.123000Z"),
+        legacy_session("u1", bson_date, "pull"),
+        legacy_session("u1", "2024-03-03T07:00:00+00:00", "legs")
+    ])
+    await db.exercise_logs.insert_one({"user_id": "u1", "exercise_name": "Bench Press", "workout_date": "2024-03-01T18:30:00Z", "created_at": bson_date})
+    await db.users.insert_one({"id": "u1", "program_start_date": "2024-02-26T08:00:00Z", "created_at": "2024-02-25T08:00:00Z", "first_name": "2024-01-01"})
+    
+    results = await server.migrate_all_datetime_fields(batch_size=2)
+    
+    assert results["workout_sessions"] == 2
+    assert results["exercise_logs"] == 1
+    assert results["users"] == 1
+    dates = [session["date"] async for session in db.workout_sessions.find()]
+    assert all(isinstance(date, datetime) for date in dates)
+    assert sorted(server.parse_datetime(date) for date in dates) == [
+        datetime(2024, 3, 1, 18, 30, 0, 123000, tzinfo=timezone.utc),
+        bson_date,
+        datetime(2024, 3, 3, 7, 0, tzinfo=timezone.utc)
+    ]
+    user = await db.users.find_one({"id": "u1"})
+    assert isinstance(user["program_start_date"], datetime)
+    # Strings in fields that are not dates stay strings, even when they look like one
+    assert user["first_name"] == "2024-01-01"
+    session = await db.workout_sessions.find_one({"workout_type": "push"})
+    assert session["exercises"][0]["reps"] == "6-8"
+    assert session["id"] == "u1-push-2024-03-01T18:30:00.123000Z"
+
+async def test_rerun_resumes_after_the_checkpoint(db):
+    await db.workout_sessions.insert_many([legacy_session(f"u{day}", f"2024-03-{day:02d}T18:30:00Z") for day in range(1, 6)])
+    documents = await db.workout_sessions.find().sort("_id", 1).to_list(None)
+    # What an interrupted run leaves behind after its first batch of two
+    await db.migrations.insert_one({"_id": "bson_dates.workout_sessions", "last_id": documents[1]["_id"], "migrated": 2})
+    
+    assert await server.migrate_datetime_fields("workout_sessions", batch_size=2) == 5
+    
+    migrated = await db.workout_sessions.find().sort("_id", 1).to_list(None)
+    assert [isinstance(document["date"], str) for document in migrated] == [True, True, False, False, False]
+    checkpoint = await db.migrations.find_one({"_id": "bson_dates.workout_sessions"})
+    assert checkpoint["last_id"] == documents[-1]["_id"]
+    # Nothing past the checkpoint is left, so another run converts nothing
+    assert await server.migrate_datetime_fields("workout_sessions", batch_size=2) == 5
+
+async def test_legacy_sessions_get_their_day_unless_it_duplicates_another(db):
+    await db.workout_sessions.insert_many([
+        legacy_session("u1", "2024-03-01T23:30:00Z"),
+        legacy_session("u1", "2024-03-01T18:30:00Z", "pull"),
+        legacy_session("u2", datetime(2024, 3, 1, 18, 30, tzinfo=timezone.utc))
+    ])
+    # The same workout logged again after the day field existed
+    await db.workout_sessions.insert_one(dict(legacy_session("u1", datetime(2024, 3, 1, 7, tzinfo=timezone.utc)), id="relogged", day="2024-03-01"))
+    
+    results = await server.migrate_all_datetime_fields(batch_size=2)
+    
+    assert results["session_days"] == 2
+    days = {session["id"]: session.get("day") async for session in db.workout_sessions.find()}
+    assert days == {
+        "u1-push-2024-03-01T23:30:00Z": None,
+        "u1-pull-2024-03-01T18:30:00Z": "2024-03-01",
+        "u2-push-2024-03-01 18:30:00+00:00": "2024-03-01",
+        "relogged": "2024-03-01"
+    }
+    checkpoint = await db.migrations.find_one({"_id": "session_days"})
+    assert (checkpoint["updated"], checkpoint["conflicting"]) == (2, 1)
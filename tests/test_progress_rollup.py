@@ -0,0 +1,198 @@
+"""
+The progress rollup must bucket by calendar day/week/month and skip AMRAP sets in rep-based metrics.
+
+mongomock has no $dateTrunc or $regexFind, so the pipeline runs through a reference evaluator of
+the stages and operators it uses; set MONGO_TEST_URL to also check the evaluator against a real mongod.
+"""
+
+import os
+import re
+from datetime import datetime, timezone, timedelta
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import server
+
+def field_path(document: dict, path: str):
+    value = document
+    for key in path.split("."):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+def truncate_date(date: datetime, unit: str) -> datetime:
+    day = datetime(date.year, date.month, date.day, tzinfo=timezone.utc)
+    if unit == "week":
+        # Every pipeline passes startOfWeek monday
+        return day - timedelta(days=day.weekday())
+    if unit == "month":
+        return day.replace(day=1)
+    return day
+
+def evaluate(expression, document: dict, variables: dict = None):
+    """Evaluate the aggregation expressions progress_rollup_pipeline uses, with MongoDB's null handling"""
+    variables = variables or {}
+    if isinstance(expression, str) and expression.startswith("$$"):
+        name, _, path = expression[2:].partition(".")
+        return field_path(variables[name], path) if path else variables[name]
+    if isinstance(expression, str) and expression.startswith("$"):
+        return field_path(document, expression[1:])
+    if not isinstance(expression, dict):
+        return expression
+    
+    (operator, arguments), = expression.items()
+    if operator == "$let":
+        bound = {name: evaluate(value, document, variables) for name, value in arguments["vars"].items()}
+        return evaluate(arguments["in"], document, {**variables, **bound})
+    if operator == "$regexFind":
+        match = re.search(arguments["regex"], evaluate(arguments["input"], document, variables))
+        return {"match": match.group()} if match else None
+    if operator == "$dateTrunc":
+        return truncate_date(evaluate(arguments["date"], document, variables), arguments["unit"])
+    
+    values = [evaluate(argument, document, variables) for argument in (arguments if isinstance(arguments, list) else [arguments])]
+    if operator == "$cond":
+        return values[1] if values[0] else values[2]
+    if operator == "$eq":
+        return values[0] == values[1]
+    if operator == "$toDate":
+        return server.parse_datetime(values[0])
+    if None in values:
+        # Arithmetic and conversions of null are null
+        return None
+    if operator == "$toInt":
+        return int(values[0])
+    if operator == "$multiply":
+        product = 1
+        for value in values:
+            product *= value
+        return product
+    if operator == "$add":
+        return sum(values)
+    if operator == "$divide":
+        return values[0] / values[1]
+    if operator == "$round":
+        return round(values[0], values[1])
+    raise NotImplementedError(operator)
+
+def accumulate(accumulator: dict, documents: list):
+    (operator, expression), = accumulator.items()
+    # $sum and $max skip nulls; $sum of nothing is 0, $max of nothing is null
+    values = [value for value in (evaluate(expression, document) for document in documents) if value is not None]
+    if operator == "$sum":
+        return sum(values)
+    if operator == "$max":
+        return max(values, default=None)
+    raise NotImplementedError(operator)
+
+def run_pipeline(pipeline: list, documents: list) -> list:
+    """Run the stages progress_rollup_pipeline builds over in-memory documents"""
+    for stage in pipeline:
+        (name, specification), = stage.items()
+        if name == "$match":
+            documents = [document for document in documents if all(document.get(key) == value for key, value in specification.items())]
+        elif name == "$project":
+            projected = []
+            for document in documents:
+                row = {}
+                for key, expression in specification.items():
+                    if expression == 1:
+                        if key in document:
+                            row[key] = document[key]
+                    elif expression != 0:
+                        value = evaluate(expression, document)
+                        if value is not None or not isinstance(expression, str):
+                            row[key] = value
+                projected.append(row)
+            documents = projected
+        elif name == "$group":
+            groups = {}
+            for document in documents:
+                group_id = {key: evaluate(expression, document) for key, expression in specification["_id"].items()}
+                groups.setdefault(tuple(sorted(group_id.items())), (group_id, []))[1].append(document)
+            documents = [
+                dict({key: accumulate(accumulator, members) for key, accumulator in specification.items() if key != "_id"}, _id=group_id)
+                for group_id, members in groups.values()
+            ]
+        elif name == "$sort":
+            documents = sorted(documents, key=lambda document: tuple(field_path(document, key) for key in specification))
+        else:
+            raise NotImplementedError(name)
+    return documents
+
+def exercise_log(exercise_name: str, workout_date, load: float, sets: int, reps: str) -> dict:
+    return {"user_id": "u1", "exercise_name": exercise_name, "workout_date": workout_date, "load": load, "sets": sets, "reps": reps}
+
+# Wednesday 2024-01-31 to Monday 2024-02-05: two weeks, two months
+SAMPLE_LOGS = [
+    exercise_log("Bench Press", datetime(2024, 1, 31, 18, tzinfo=timezone.utc), 100, 3, "8-10"),
+    exercise_log("Bench Press", datetime(2024, 2, 1, 18, tzinfo=timezone.utc), 105, 3, "6-8"),
+    exercise_log("Bench Press", datetime(2024, 2, 1, 19, tzinfo=timezone.utc), 60, 2, "AMRAP"),
+    # Not yet migrated to a BSON date
+    exercise_log("Bench Press", "2024-02-04T23:30:00Z", 107.5, 3, "5"),
+    exercise_log("Bench Press", datetime(2024, 2, 5, 0, 30, tzinfo=timezone.utc), 110, 3, "3-5"),
+    exercise_log("Pull-Up", datetime(2024, 2, 1, 18, tzinfo=timezone.utc), 0, 3, "AMRAP"),
+    exercise_log("Pull-Up", datetime(2024, 2, 5, 18, tzinfo=timezone.utc), 10, 3, "AMRAP")
+]
+
+def rollup(resolution: str, metric: str, by_exercise: bool = False, query: dict = None) -> list:
+    pipeline = server.progress_rollup_pipeline(
+        query or {"user_id": "u1"}, server.ProgressResolution(resolution), server.ProgressMetric(metric), by_exercise
+    )
+    return run_pipeline(pipeline, SAMPLE_LOGS)
+
+def test_weeks_start_on_monday_and_months_on_the_first():
+    weekly = rollup("week", "max_load", query={"user_id": "u1", "exercise_name": "Bench Press"})
+    monthly = rollup("month", "max_load", query={"user_id": "u1", "exercise_name": "Bench Press"})
+    
+    assert weekly == [
+        {"date": datetime(2024, 1, 29, tzinfo=timezone.utc), "value": 107.5, "logs": 4},
+        {"date": datetime(2024, 2, 5, tzinfo=timezone.utc), "value": 110, "logs": 1}
+    ]
+    assert monthly == [
+        {"date": datetime(2024, 1, 1, tzinfo=timezone.utc), "value": 100, "logs": 1},
+        {"date": datetime(2024, 2, 1, tzinfo=timezone.utc), "value": 110, "logs": 4}
+    ]
+
+def test_amrap_sets_are_skipped_by_rep_based_metrics():
+    daily_volume = rollup("day", "volume", by_exercise=True)
+    daily_e1rm = rollup("day", "e1rm", by_exercise=True)
+    
+    volume = {(row["exercise_name"], row["date"].day): row["value"] for row in daily_volume}
+    e1rm = {(row["exercise_name"], row["date"].day): row["value"] for row in daily_e1rm}
+    # rep_count is the first number in reps; the AMRAP log the same day adds nothing
+    assert volume[("Bench Press", 1)] == 105 * 3 * 6
+    assert e1rm[("Bench Press", 1)] == round(105 * (1 + 6 / 30), 2)
+    # A bucket of only AMRAP sets has no volume and no estimate
+    assert volume[("Pull-Up", 5)] == 0
+    assert e1rm[("Pull-Up", 5)] is None
+    # ...but its loads still count toward max_load
+    max_load = {(row["exercise_name"], row["date"].day): row["value"] for row in rollup("day", "max_load", by_exercise=True)}
+    assert max_load[("Pull-Up", 5)] == 10
+    assert max_load[("Bench Press", 1)] == 105
+
+def test_rows_are_sorted_by_exercise_then_date():
+    rows = rollup("week", "volume", by_exercise=True)
+    assert [(row["exercise_name"], row["date"].day) for row in rows] == [
+        ("Bench Press", 29), ("Bench Press", 5), ("Pull-Up", 29), ("Pull-Up", 5)
+    ]
+    assert all("exercise_name" not in row for row in rollup("week", "volume"))
+
+@pytest.mark.anyio
+@pytest.mark.skipif(not os.environ.get("MONGO_TEST_URL"), reason="needs a real mongod at MONGO_TEST_URL")
+@pytest.mark.parametrize("resolution", [resolution.value for resolution in server.ProgressResolution])
+@pytest.mark.parametrize("metric", [metric.value for metric in server.ProgressMetric])
+@pytest.mark.parametrize("by_exercise", [False, True])
+async def test_evaluator_matches_mongod(resolution, metric, by_exercise):
+    client = AsyncIOMotorClient(os.environ["MONGO_TEST_URL"], tz_aware=True)
+    collection = client["ppl_test_rollup"].exercise_logs
+    try:
+        await collection.drop()
+        await collection.insert_many([dict(log) for log in SAMPLE_LOGS])
+        pipeline = server.progress_rollup_pipeline(
+            {"user_id": "u1"}, server.ProgressResolution(resolution), server.ProgressMetric(metric), by_exercise
+        )
+        assert await collection.aggregate(pipeline).to_list(None) == rollup(resolution, metric, by_exercise)
+    finally:
+        await collection.drop()
+        client.close()
@@ -0,0 +1,72 @@
+"""
+The closed-form schedule must agree with the day-by-day walk it replaced.
+"""
+
+import random
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+import server
+
+def legacy_workout_for_day(start_date: datetime, target_date: datetime, rest_day: int):
+    """Reference day-by-day walk that get_workout_for_day used before the closed form"""
+    rest_weekday = (rest_day + 6) % 7
+    if target_date.weekday() == rest_weekday:
+        return ("rest", 0)
+    
+    workout_days_count = 0
+    current_day = start_date
+    while current_day < target_date:
+        if current_day.weekday() != rest_weekday:
+            workout_days_count += 1
+        current_day += timedelta(days=1)
+    
+    return server.WORKOUT_CYCLE[workout_days_count % 6]
+
+def random_dates(seed: int, samples: int):
+    rng = random.Random(seed)
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for _ in range(samples):
+        start_date = base + timedelta(days=rng.randrange(0, 14), seconds=rng.randrange(0, 86400), microseconds=rng.randrange(0, 1000000))
+        # Include targets before the start, at the same instant and at the same time of day
+        offset = rng.choice([
+            timedelta(days=rng.randrange(-10, 400)),
+            timedelta(days=rng.randrange(-10, 400), seconds=rng.randrange(-86400, 86400)),
+            timedelta(0),
+        ])
+        yield start_date, start_date + offset
+
+@pytest.mark.parametrize("rest_day", range(7))
+def test_closed_form_matches_legacy_walk(rest_day):
+    for start_date, target_date in random_dates(seed=42 + rest_day, samples=300):
+        expected = legacy_workout_for_day(start_date, target_date, rest_day)
+        actual = server.get_workout_for_day(start_date, target_date, rest_day)
+        assert actual == expected, f"start={start_date.isoformat()} target={target_date.isoformat()}"
+
+def per_day_schedule(start_date: datetime, first_date: datetime, days: int, rest_day: int):
+    """Schedule rows built one lookup per day, the way /calendar did before iter_schedule"""
+    rows = []
+    for i in range(days):
+        target_date = first_date + timedelta(days=i)
+        week, phase = server.get_week_and_phase(start_date, target_date)
+        workout_type, workout_number = legacy_workout_for_day(start_date, target_date, rest_day)
+        rows.append((target_date, week, phase, workout_type, workout_number))
+    return rows
+
+@pytest.mark.parametrize("rest_day", range(7))
+def test_iter_schedule_matches_per_day_lookups(rest_day):
+    for start_date, first_date in random_dates(seed=7 + rest_day, samples=50):
+        expected = per_day_schedule(start_date, first_date, 60, rest_day)
+        actual = [
+            (target_date, week, phase) + server.split_workout_key(workout_key)
+            for target_date, week, phase, workout_key, _ in server.iter_schedule(start_date, first_date, 60, rest_day)
+        ]
+        assert actual == expected, f"start={start_date.isoformat()} first={first_date.isoformat()}"
+
+def test_dates_before_the_start_are_in_the_first_week():
+    start_date = datetime(2024, 1, 10, 18, 0, tzinfo=timezone.utc)
+    for target_date in [start_date - timedelta(days=15), start_date - timedelta(hours=12), start_date.replace(hour=6)]:
+        assert server.get_week_and_phase(start_date, target_date) == (1, "phase1")
+    for _, week, phase, _, _ in server.iter_schedule(start_date, start_date - timedelta(days=20), 21, 0):
+        assert (week, phase) == (1, "phase1")
@@ -0,0 +1,49 @@
+"""
+FastJSONResponse must render the same bytes that jsonable_encoder + JSONResponse did.
+"""
+
+import random
+from datetime import datetime, timezone, timedelta
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import server
+
+def sample_progress(rng: random.Random, days: int) -> dict:
+    """An /all-progress payload with fractional loads and unlogged loads"""
+    start_date = datetime(2024, 1, 1, 18, 5, 7, 123000, tzinfo=timezone.utc)
+    progress = {}
+    for day in range(days):
+        workout_date = start_date + timedelta(days=day, seconds=rng.randrange(3600))
+        for exercise_name in rng.sample(list(server.EXERCISE_IDS), 6):
+            progress.setdefault(exercise_name, []).append({
+                "date": workout_date,
+                "load": rng.choice([round(rng.uniform(20, 180), 1), rng.uniform(20, 180), 100.0, None]),
+                "sets": 3,
+                "reps": rng.choice(["8-10", "AMRAP", "30 sec"])
+            })
+    return progress
+
+def sample_calendar(rng: random.Random, days: int) -> list:
+    """A /calendar payload with completed days, rest days and deload weeks"""
+    start_date = datetime(2024, 1, 1, 6, 30, tzinfo=timezone.utc)
+    first_date = start_date + timedelta(days=rng.randrange(40), microseconds=rng.randrange(1000000))
+    completed_keys = {
+        f"{target_date.date()}_{workout_key}"
+        for target_date, _, _, workout_key, _ in server.iter_schedule(start_date, first_date, days, 0)
+        if rng.random() < 0.5
+    }
+    return server.build_calendar_entries(start_date, 0, first_date, days, completed_keys)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_fast_response_body_matches_jsonable_encoder(seed):
+    rng = random.Random(seed)
+    payloads = [
+        sample_progress(rng, 60),
+        sample_calendar(rng, 90),
+        {"message": "Séance enregistrée 💪", "created": True, "gender": server.Gender.FEMALE, "weight": 72.5, "missing": None}
+    ]
+    for payload in payloads:
+        assert server.FastJSONResponse(payload).body == JSONResponse(jsonable_encoder(payload)).body
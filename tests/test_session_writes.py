@@ -0,0 +1,103 @@
+"""
+Session writes must be safe to retry: with or without an Idempotency-Key, and when an import runs twice.
+"""
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+def session_body(user_id: str, load: float = 100) -> dict:
+    return {
+        "user_id": user_id,
+        "workout_type": "push",
+        "workout_number": 1,
+        "week": 1,
+        "phase": "phase1",
+        "exercises": [
+            {"name": "Bench Press", "sets": 3, "reps": "6-8", "load": load},
+            {"name": "Push-ups", "sets": 3, "reps": "AMRAP"}
+        ],
+        "date": "2026-10-13T18:30:00.123456Z"
+    }
+
+async def count_documents(db, user_id: str):
+    return (
+        await db.workout_sessions.count_documents({"user_id": user_id}),
+        await db.exercise_logs.count_documents({"user_id": user_id})
+    )
+
+async def test_idempotency_key_replays_the_stored_response(api, db, user_id):
+    headers = {"Idempotency-Key": "session-1"}
+    first = await api.post(f"/api/users/{user_id}/workout-session", json=session_body(user_id), headers=headers)
+    replay = await api.post(f"/api/users/{user_id}/workout-session", json=session_body(user_id), headers=headers)
+    
+    assert first.status_code == 200
+    assert first.json()["created"] is True
+    assert "Idempotent-Replayed" not in first.headers
+    assert replay.status_code == 200
+    assert replay.json() == first.json()
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert await count_documents(db, user_id) == (1, 1)
+
+async def test_idempotency_key_reused_for_a_different_body_is_rejected(api, db, user_id):
+    headers = {"Idempotency-Key": "session-1"}
+    await api.post(f"/api/users/{user_id}/workout-session", json=session_body(user_id), headers=headers)
+    response = await api.post(f"/api/users/{user_id}/workout-session", json=session_body(user_id, load=105), headers=headers)
+    
+    assert response.status_code == 422
+    assert await count_documents(db, user_id) == (1, 1)
+
+async def test_retry_without_key_writes_nothing_new(api, db, user_id):
+    first = await api.post(f"/api/users/{user_id}/workout-session", json=session_body(user_id))
+    retry = await api.post(f"/api/users/{user_id}/workout-session", json=session_body(user_id))
+    
+    assert first.json()["created"] is True
+    assert retry.status_code == 200
+    assert retry.json()["created"] is False
+    assert await count_documents(db, user_id) == (1, 1)
+
+async def test_changed_resubmission_is_a_conflict(api, db, user_id):
+    await api.post(f"/api/users/{user_id}/workout-session", json=session_body(user_id))
+    response = await api.post(f"/api/users/{user_id}/workout-session", json=session_body(user_id, load=105))
+    
+    assert response.status_code == 409
+    assert response.json()["detail"]["conflicts"] == [{"day": "2026-10-13", "workout_type": "push", "workout_number": 1}]
+    stored = await db.workout_sessions.find_one({"user_id": user_id})
+    assert stored["exercises"][0]["load"] == 100
+
+async def test_batch_retry_writes_nothing_new(api, db, user_id):
+    second = dict(session_body(user_id), workout_type="pull", date="2026-10-14T18:30:00Z")
+    first = await api.post(f"/api/users/{user_id}/workout-sessions:batch", json=[session_body(user_id), second])
+    retry = await api.post(f"/api/users/{user_id}/workout-sessions:batch", json=[session_body(user_id), second])
+    
+    assert first.json()["created"] == 2
+    assert retry.json()["created"] == 0
+    assert await count_documents(db, user_id) == (2, 2)
+
+async def test_importing_a_file_twice_reports_duplicates(api, db, user_id):
+    upload = (
+        "date,workout_type,workout_number,exercise_name,sets,reps,load\n"
+        "2026-01-05,push,1,Bench Press,3,6-8,80\n"
+        "2026-01-05,push,1,Overhead Press,3,8-10,40\n"
+        "2026-01-06,pull,1,Barbell Row,3,8-10,60\n"
+    )
+    first = await api.post(f"/api/users/{user_id}/import", content=upload)
+    second = await api.post(f"/api/users/{user_id}/import", content=upload)
+    
+    assert first.json()["sessions"] == 2
+    assert first.json()["exercise_logs"] == 3
+    assert first.json()["duplicate_sessions"] == 0
+    assert second.json()["sessions"] == 0
+    assert second.json()["exercise_logs"] == 0
+    assert second.json()["duplicate_sessions"] == 2
+    assert second.json()["conflicting_sessions"] == 0
+    assert await count_documents(db, user_id) == (2, 3)
+
+async def test_session_for_another_user_is_rejected(api, db, user_id):
+    single = await api.post(f"/api/users/{user_id}/workout-session", json=session_body("victim"))
+    batch = await api.post(f"/api/users/{user_id}/workout-sessions:batch", json=[session_body(user_id), session_body("victim")])
+    
+    assert single.status_code == 400
+    assert batch.status_code == 400
+    assert await count_documents(db, "victim") == (0, 0)
+    assert await count_documents(db, user_id) == (0, 0)
@@ -0,0 +1,104 @@
+"""
+/sync tokens must never skip a document: not one still being written, not one on a later page.
+"""
+
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+def session_body(user_id: str, day: int, workout_type: str = "push") -> dict:
+    return {
+        "user_id": user_id,
+        "workout_type": workout_type,
+        "workout_number": 1,
+        "week": 1,
+        "phase": "phase1",
+        "exercises": [{"name": "Bench Press", "sets": 3, "reps": "6-8", "load": 100}],
+        "date": f"2026-10-{day:02d}T18:30:00Z"
+    }
+
+async def sync(api, user_id: str, token: str = None) -> dict:
+    response = await api.get(f"/api/users/{user_id}/sync", params={"since": token} if token else None)
+    assert response.status_code == 200
+    return response.json()
+
+async def test_token_stops_before_a_write_in_flight(api, db, user_id):
+    # A writer that has reserved its sequence but not written its documents yet
+    in_flight = await server.reserve_sync_sequence(user_id)
+    await api.post(f"/api/users/{user_id}/workout-session", json=session_body(user_id, 13))
+    
+    first = await sync(api, user_id)
+    assert first["workout_sessions"] == []
+    
+    await server.release_sync_sequences({user_id: in_flight}, set())
+    second = await sync(api, user_id, first["token"])
+    assert [session["workout_type"] for session in second["workout_sessions"]] == ["push"]
+    assert len(second["exercise_logs"]) == 1
+
+async def test_stale_pending_entry_is_ignored_and_pruned(api, db, user_id):
+    # Left behind by a writer that died between reserving and releasing
+    reserved_at = datetime.now(timezone.utc) - timedelta(seconds=server.SYNC_PENDING_TIMEOUT_SECONDS + 1)
+    await db.users.update_one({"id": user_id}, {
+        "$inc": {"sync_sequence": 1},
+        "$push": {"pending_sequences": {"sequence": 99, "reserved_at": reserved_at}}
+    })
+    await api.post(f"/api/users/{user_id}/workout-session", json=session_body(user_id, 13))
+    
+    changes = await sync(api, user_id)
+    assert len(changes["workout_sessions"]) == 1
+    user = await db.users.find_one({"id": user_id})
+    assert user["pending_sequences"] == []
+
+async def test_profile_only_change_is_synced_without_documents(api, db):
+    response = await api.post("/api/users", json={
+        "first_name": "Test",
+        "last_name": "User",
+        "age": 30,
+        "height": 180,
+        "weight": 80,
+        "gender": "male",
+        "phone": "5550000000",
+        "rest_day": 0
+    })
+    user_id = response.json()["id"]
+    first = await sync(api, user_id)
+    assert first["profile"]["program_start_date"] is None
+    
+    await api.post(f"/api/users/{user_id}/start-program")
+    second = await sync(api, user_id, first["token"])
+    assert second["profile"]["program_start_date"] is not None
+    assert second["workout_sessions"] == []
+    assert second["exercise_logs"] == []
+    
+    # A session write alone leaves the profile out
+    await api.post(f"/api/users/{user_id}/workout-session", json=session_body(user_id, 13))
+    third = await sync(api, user_id, second["token"])
+    assert third["profile"] is None
+    assert len(third["workout_sessions"]) == 1
+
+async def test_pages_add_up_to_the_whole_history(api, db, user_id, monkeypatch):
+    sessions = [session_body(user_id, day, workout_type) for day, workout_type in [(13, "push"), (14, "pull"), (15, "legs")]]
+    await api.post(f"/api/users/{user_id}/workout-sessions:batch", json=sessions)
+    unpaged = await sync(api, user_id)
+    
+    monkeypatch.setattr(server, "SYNC_PAGE_SIZE", 2)
+    pages = [await sync(api, user_id)]
+    # Written between pages, so it belongs to the next sync rather than this one
+    await api.post(f"/api/users/{user_id}/workout-session", json=session_body(user_id, 16, "pull"))
+    while pages[-1]["has_more"]:
+        pages.append(await sync(api, user_id, pages[-1]["token"]))
+    
+    assert len(pages) == 3
+    assert all(len(page["workout_sessions"]) + len(page["exercise_logs"]) <= 2 for page in pages)
+    assert pages[0]["profile"] is not None
+    assert all(page["profile"] is None for page in pages[1:])
+    for name in server.SYNC_COLLECTIONS:
+        assert [document for page in pages for document in page[name]] == unpaged[name]
+    assert pages[-1]["token"] == unpaged["token"]
+    
+    changes = await sync(api, user_id, pages[-1]["token"])
+    assert [session["date"][:10] for session in changes["workout_sessions"]] == ["2026-10-16"]
@@ -0,0 +1,29 @@
+"""
+Cached profiles must not hide a program started through another server process.
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+async def test_program_started_by_another_process_is_seen_immediately(api, db):
+    response = await api.post("/api/users", json={
+        "first_name": "Test",
+        "last_name": "User",
+        "age": 30,
+        "height": 180,
+        "weight": 80,
+        "gender": "male",
+        "phone": "5550000000",
+        "rest_day": 0
+    })
+    user_id = response.json()["id"]
+    assert (await api.get(f"/api/users/{user_id}")).status_code == 200
+    assert (await api.get(f"/api/users/{user_id}/calendar")).status_code == 400
+    
+    # What start-program on another process writes; this process's cache never hears of it
+    await db.users.update_one({"id": user_id}, {"$set": {"program_start_date": datetime.now(timezone.utc)}})
+    
+    assert (await api.get(f"/api/users/{user_id}/calendar")).status_code == 200
@@ -0,0 +1,100 @@
+"""
+The persisted next-workout pointer must pick the same workout as the full-history scan it replaced.
+"""
+
+import random
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+def full_scan_current_workout(completed_keys: set, target_date: datetime, start_date: datetime, rest_day: int):
+    """Reference walk that get_current_workout_accounting_for_completion used before the pointer"""
+    rest_weekday = (rest_day + 6) % 7
+    current_day = start_date
+    index = 0
+    while current_day <= target_date:
+        if current_day.weekday() != rest_weekday:
+            workout_type, workout_number = server.WORKOUT_CYCLE[index % 6]
+            if f"{current_day.date()}_{workout_type}{workout_number}" not in completed_keys:
+                return workout_type, workout_number
+            index += 1
+        current_day += timedelta(days=1)
+    return server.get_workout_for_day(start_date, target_date, rest_day)
+
+def random_history(rng: random.Random, user_id: str, start_date: datetime, rest_day: int, days: int):
+    """Completed sessions for a random subset of scheduled workouts, plus some off-schedule ones"""
+    completion_rate = rng.choice([0.5, 0.9, 1.0])
+    sessions = []
+    for target_date, _, _, workout_key, is_rest in server.iter_schedule(start_date, start_date, days, rest_day):
+        if is_rest or rng.random() > completion_rate:
+            continue
+        workout_type, workout_number = server.split_workout_key(workout_key)
+        if rng.random() < 0.05:
+            # Logged a different workout than the schedule expected that day
+            workout_type, workout_number = rng.choice(server.WORKOUT_CYCLE)
+        # Sessions are logged at any time of the scheduled day
+        day_start = datetime.combine(target_date.date(), datetime.min.time(), tzinfo=timezone.utc)
+        session_date = day_start + timedelta(seconds=rng.randrange(86400))
+        sessions.append({
+            "id": f"{user_id}-{len(sessions)}",
+            "user_id": user_id,
+            "workout_type": workout_type,
+            "workout_number": workout_number,
+            "date": session_date,
+            "day": session_date.date().isoformat(),
+            "completed": True
+        })
+    return sessions
+
+@pytest.mark.parametrize("seed", range(40))
+async def test_pointer_matches_full_history_scan(db, seed):
+    rng = random.Random(seed)
+    user_id = f"user-{seed}"
+    start_date = datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(days=rng.randrange(14), seconds=rng.randrange(86400))
+    rest_day = rng.randrange(7)
+    days = rng.randrange(10, 120)
+    await db.users.insert_one({"id": user_id, "program_start_date": start_date, "rest_day": rest_day, "next_workout_index": 0})
+    
+    # Clients log out of order and in batches of different sizes
+    sessions = random_history(rng, user_id, start_date, rest_day, days)
+    rng.shuffle(sessions)
+    while sessions:
+        size = rng.randint(1, 5)
+        batch, sessions = sessions[:size], sessions[size:]
+        await db.workout_sessions.insert_many([dict(session) for session in batch])
+        # What the write's sequence reservation returns
+        user = await db.users.find_one({"id": user_id}, server.RESERVED_USER_FIELDS)
+        await server.advance_workout_pointer(user, batch)
+    
+    completed_keys = await server.get_completed_workout_keys(user_id)
+    for _ in range(5):
+        target_date = start_date + timedelta(days=rng.randrange(days + 14), seconds=rng.randrange(86400))
+        expected = full_scan_current_workout(completed_keys, target_date, start_date, rest_day)
+        actual = await server.get_current_workout_accounting_for_completion(user_id, target_date, start_date, rest_day)
+        assert actual == expected, f"target={target_date.isoformat()}"
+    
+    # Incremental advances must leave nothing for the repair command to fix
+    previous, index = await server.repair_workout_pointer(user_id)
+    assert previous == index
+
+async def test_backfill_sets_the_pointer_of_users_from_before_it(db):
+    rng = random.Random(7)
+    start_date = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    await db.users.insert_many([
+        {"id": "legacy", "program_start_date": start_date, "rest_day": 0},
+        {"id": "not-started", "program_start_date": None, "rest_day": 0},
+        {"id": "current", "program_start_date": start_date, "rest_day": 0, "next_workout_index": 2}
+    ])
+    sessions = random_history(rng, "legacy", start_date, 0, 60)
+    await db.workout_sessions.insert_many(sessions)
+    
+    assert await server.backfill_workout_pointers() == 1
+    previous, index = await server.repair_workout_pointer("legacy")
+    assert previous == index
+    assert "next_workout_index" not in await db.users.find_one({"id": "not-started"})
+    assert (await db.users.find_one({"id": "current"}))["next_workout_index"] == 2
+    assert await server.backfill_workout_pointers() == 0
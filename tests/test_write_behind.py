@@ -0,0 +1,104 @@
+"""
+The write-behind queue must group-commit across users, push back when full and lose nothing it acknowledged.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+def session_body(user_id: str, day: int = 13) -> dict:
+    return {
+        "user_id": user_id,
+        "workout_type": "push",
+        "workout_number": 1,
+        "week": 1,
+        "phase": "phase1",
+        "exercises": [{"name": "Bench Press", "sets": 3, "reps": "6-8", "load": 100}],
+        "date": f"2026-10-{day:02d}T18:30:00Z"
+    }
+
+def queued_write(user_id: str, day: int):
+    session, exercise_logs = server.build_session_documents(user_id, server.WorkoutSessionCreate(**session_body(user_id, day)))
+    return user_id, [session], exercise_logs
+
+@pytest.fixture
+async def queue(db, monkeypatch):
+    """A write-behind queue that holds writes for 10 seconds unless flushed; started by each test"""
+    queue = server.SessionWriteQueue(max_size=10, max_delay_seconds=10, max_documents=1000)
+    monkeypatch.setattr(server, "WRITE_BEHIND", True)
+    monkeypatch.setattr(server, "session_write_queue", queue)
+    yield queue
+    await queue.close()
+
+async def create_user(api) -> str:
+    response = await api.post("/api/users", json={
+        "first_name": "Test",
+        "last_name": "User",
+        "age": 30,
+        "height": 180,
+        "weight": 80,
+        "gender": "male",
+        "phone": "5550000000",
+        "rest_day": 0
+    })
+    user_id = response.json()["id"]
+    await api.post(f"/api/users/{user_id}/start-program")
+    return user_id
+
+async def test_writes_of_different_users_commit_together_on_close(api, db, queue):
+    queue.start()
+    user_ids = [await create_user(api) for _ in range(3)]
+    responses = await asyncio.gather(*[
+        api.post(f"/api/users/{user_id}/workout-session", json=session_body(user_id))
+        for user_id in user_ids
+    ])
+    # Same shape as without write-behind
+    assert [response.json() for response in responses] == [{"message": "Workout session logged", "created": True}] * 3
+    assert queue.stats()["batches"] == 0
+    
+    task = queue.task
+    await queue.close()
+    
+    assert task.cancelled()
+    assert queue.stats()["enabled"] is False
+    assert queue.batches == 1
+    assert queue.largest_batch == 3
+    assert queue.committed_sessions == 3
+    assert await db.workout_sessions.count_documents({"user_id": {"$in": user_ids}}) == 3
+
+async def test_full_queue_holds_writers_back(db, user_id):
+    queue = server.SessionWriteQueue(max_size=1, max_delay_seconds=10, max_documents=1000)
+    await queue.enqueue(*queued_write(user_id, 13))
+    blocked = asyncio.create_task(queue.enqueue(*queued_write(user_id, 14)))
+    await asyncio.sleep(0.05)
+    assert not blocked.done()
+    
+    # A writer that gives up waiting leaves nothing behind
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(queue.enqueue(*queued_write(user_id, 15)), 0.05)
+    assert len(queue.pending[user_id]) == 2
+    
+    queue.start()
+    await blocked
+    await queue.close()
+    assert user_id not in queue.pending
+    assert await db.workout_sessions.count_documents({"user_id": user_id}) == 2
+
+async def test_reads_see_the_users_queued_writes(api, db, queue, user_id):
+    queue.start()
+    response = await api.post(f"/api/users/{user_id}/workout-session", json=session_body(user_id))
+    assert response.json()["created"] is True
+    assert await db.workout_sessions.count_documents({"user_id": user_id}) == 0
+    
+    started = time.monotonic()
+    changes = (await api.get(f"/api/users/{user_id}/sync")).json()
+    
+    assert len(changes["workout_sessions"]) == 1
+    # flush_user commits at once instead of waiting out max_delay_seconds
+    assert time.monotonic() - started < 5
+    assert queue.batches == 1